@@ -4,16 +4,20 @@ set -euo pipefail
 usage() {
   cat <<'EOF'
 Usage:
-  ./backend/export.sh --host http://HOST:8000 --avatar AVATAR_ID --file games/my-game.html [--filename my-game.html] [--token TOKEN]
+  ./backend/export.sh --host http://HOST:8000 --avatar AVATAR_ID --file games/my-game.html [--filename my-game.html] [--token TOKEN] [--compress gzip|zstd|none] [--force]
 
 What it does:
   1) Verifies the game contract locally (skills/verify-game/scripts/verify.py)
-  2) Uploads the HTML file to the host via POST /api/games (multipart)
+  2) Asks the host whether it already has this exact file (GET /api/games/hash/<sha256>)
+  3) Uploads the (compressed) HTML file to the host via POST /api/games (multipart)
 
 Notes:
   - Requires: curl, uv (and a local Python via uv)
   - Recommended: run via `uv` (see AGENTS.md)
   - Upload token defaults to env `MARIBRO_UPLOAD_TOKEN` or `maribro-upload`
+  - Unchanged uploads are skipped; pass --force to upload anyway
+  - Uploads are gzip-compressed by default (zstd needs `zstd` locally and `zstandard` on the host;
+    a host without it answers 415 and the upload is retried with gzip)
 EOF
 }
 
@@ -22,6 +26,8 @@ AVATAR=""
 FILE=""
 FILENAME=""
 TOKEN="${MARIBRO_UPLOAD_TOKEN:-maribro-upload}"
+COMPRESS="gzip"
+FORCE=0
 
 while [[ $# -gt 0 ]]; do
   case "$1" in
@@ -30,6 +36,8 @@ while [[ $# -gt 0 ]]; do
     --file) FILE="${2:-}"; shift 2 ;;
     --filename) FILENAME="${2:-}"; shift 2 ;;
     --token) TOKEN="${2:-}"; shift 2 ;;
+    --compress) COMPRESS="${2:-}"; shift 2 ;;
+    --force) FORCE=1; shift ;;
     -h|--help) usage; exit 0 ;;
     *) echo "Unknown arg: $1" >&2; usage; exit 2 ;;
   esac
@@ -45,22 +53,94 @@ if [[ ! -f "$FILE" ]]; then
   exit 2
 fi
 
-echo "[1/2] Verifying $FILE"
+case "$COMPRESS" in
+  gzip|zstd|none) ;;
+  *) echo "Unknown --compress value: $COMPRESS (expected gzip, zstd or none)" >&2; exit 2 ;;
+esac
+
+if [[ "$COMPRESS" == "zstd" ]] && ! command -v zstd >/dev/null 2>&1; then
+  echo "--compress zstd needs the zstd command locally (install it, or use --compress gzip)" >&2
+  exit 2
+fi
+
+TARGET_NAME="${FILENAME:-$(basename "$FILE")}"
+
+echo "[1/3] Verifying $FILE"
 uv run python3 skills/verify-game/scripts/verify.py "$FILE"
 
-echo "[2/2] Uploading to $HOST/api/games"
-args=(
-  -sS
-  -X POST
-  "$HOST/api/games"
-  -H "X-Maribro-Token: $TOKEN"
-  -F "creator_avatar_id=$AVATAR"
-  -F "upload_token=$TOKEN"
-  -F "file=@$FILE;type=text/html"
-)
-if [[ -n "$FILENAME" ]]; then
-  args+=(-F "filename=$FILENAME")
+echo "[2/3] Checking $HOST for an identical upload"
+SHA256="$(python3 -c 'import hashlib,sys; print(hashlib.sha256(open(sys.argv[1],"rb").read()).hexdigest())' "$FILE")"
+if [[ "$FORCE" -eq 0 ]]; then
+  # Any failure here (old host, network blip) just falls through to a normal upload.
+  exists="$(
+    curl -sS -G "$HOST/api/games/hash/$SHA256" \
+      -H "X-Maribro-Token: $TOKEN" \
+      --data-urlencode "filename=$TARGET_NAME" \
+      --data-urlencode "creator_avatar_id=$AVATAR" 2>/dev/null \
+      | python3 -c 'import json,sys; print("yes" if json.load(sys.stdin).get("exists") else "no")' 2>/dev/null \
+      || echo "no"
+  )"
+  if [[ "$exists" == "yes" ]]; then
+    echo "Host already has this version of $TARGET_NAME (sha256 $SHA256); skipping upload."
+    echo "Done."
+    exit 0
+  fi
+fi
+
+TMP_DIR="$(mktemp -d)"
+trap 'rm -rf "$TMP_DIR"' EXIT
+
+prepare_upload() {
+  # Sets UPLOAD_FILE / UPLOAD_NAME / UPLOAD_TYPE for the encoding in $COMPRESS.
+  case "$COMPRESS" in
+    zstd)
+      UPLOAD_FILE="$TMP_DIR/$TARGET_NAME.zst"
+      zstd -q -19 -c "$FILE" >"$UPLOAD_FILE"
+      UPLOAD_TYPE="application/zstd"
+      ;;
+    gzip)
+      UPLOAD_FILE="$TMP_DIR/$TARGET_NAME.gz"
+      gzip -9 -c "$FILE" >"$UPLOAD_FILE"
+      UPLOAD_TYPE="application/gzip"
+      ;;
+    none)
+      UPLOAD_FILE="$FILE"
+      UPLOAD_TYPE="text/html"
+      ;;
+  esac
+  UPLOAD_NAME="$(basename "$UPLOAD_FILE")"
+}
+
+upload() {
+  # Prints the HTTP status; the response body goes to $TMP_DIR/response.json.
+  local args=(
+    -sS
+    -o "$TMP_DIR/response.json"
+    -w "%{http_code}"
+    -X POST
+    "$HOST/api/games"
+    -H "X-Maribro-Token: $TOKEN"
+    -F "creator_avatar_id=$AVATAR"
+    -F "upload_token=$TOKEN"
+    -F "filename=$TARGET_NAME"
+    -F "file=@$UPLOAD_FILE;type=$UPLOAD_TYPE;filename=$UPLOAD_NAME"
+  )
+  if [[ "$COMPRESS" != "none" ]]; then
+    args+=(-F "content_encoding=$COMPRESS")
+  fi
+  curl "${args[@]}"
+}
+
+prepare_upload
+echo "[3/3] Uploading to $HOST/api/games ($COMPRESS, $(wc -c <"$UPLOAD_FILE" | tr -d ' ') bytes)"
+status="$(upload)"
+if [[ "$status" == "415" && "$COMPRESS" == "zstd" ]] \
+  && grep -q '"unsupported_encoding"' "$TMP_DIR/response.json"; then
+  echo "Host can't decode zstd uploads; retrying with gzip"
+  COMPRESS="gzip"
+  prepare_upload
+  status="$(upload)"
 fi
 
-curl "${args[@]}" | python3 -c 'import json,sys; print(json.dumps(json.load(sys.stdin), indent=2))'
+python3 -c 'import json,sys; print(json.dumps(json.load(open(sys.argv[1])), indent=2))' "$TMP_DIR/response.json"
 echo "Done."
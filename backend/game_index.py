@@ -0,0 +1,313 @@
+from __future__ import annotations
+
+import bisect
+import random
+import re
+import threading
+from typing import Any, Dict, Iterable, List, Optional, Set, Tuple
+
+# In-memory indexes over the game catalog and per-room play history, backing
+# `GET /api/games?q=&creator=&unplayed=&sort=&limit=` and `GET /api/games/pick`.
+#
+# Both halves are kept in sync incrementally: catalog entries are re-indexed only
+# when their `rev` changes, and each room only applies history entries appended
+# since the last sync (a reset or rewrite is detected and triggers a rebuild).
+# The catalog half is pushed in by whoever already has the listing (the server's
+# `_list_games`, uploads), so queries never rescan the catalog themselves. That
+# keeps every worker process correct without any cross-process signalling.
+
+TOKEN_RE = re.compile(r"[a-z0-9]+")
+
+
+def tokenize(text: str) -> List[str]:
+    return TOKEN_RE.findall((text or "").lower())
+
+
+class _RandomSet:
+    # Set with O(1) add / remove / uniform random choice.
+    def __init__(self) -> None:
+        self._items: List[str] = []
+        self._pos: Dict[str, int] = {}
+
+    def __len__(self) -> int:
+        return len(self._items)
+
+    def __contains__(self, item: str) -> bool:
+        return item in self._pos
+
+    def __iter__(self):
+        return iter(self._items)
+
+    def add(self, item: str) -> None:
+        if item in self._pos:
+            return
+        self._pos[item] = len(self._items)
+        self._items.append(item)
+
+    def remove(self, item: str) -> None:
+        i = self._pos.pop(item, None)
+        if i is None:
+            return
+        last = self._items.pop()
+        if i < len(self._items):
+            self._items[i] = last
+            self._pos[last] = i
+
+    def choice(self, rng: random.Random) -> str:
+        return self._items[rng.randrange(len(self._items))]
+
+
+class _RoomPlays:
+    def __init__(self) -> None:
+        self.applied = 0
+        self.last_marker: Optional[Tuple[str, str]] = None
+        self.plays: Dict[str, int] = {}
+        self.up: Dict[str, int] = {}
+        self.down: Dict[str, int] = {}
+        # play count -> catalog games with exactly that many plays in this room
+        self.buckets: Dict[int, _RandomSet] = {}
+
+    def bucket_add(self, game_id: str) -> None:
+        self.buckets.setdefault(self.plays.get(game_id, 0), _RandomSet()).add(game_id)
+
+    def bucket_remove(self, game_id: str) -> None:
+        count = self.plays.get(game_id, 0)
+        bucket = self.buckets.get(count)
+        if bucket is not None:
+            bucket.remove(game_id)
+            if not bucket:
+                del self.buckets[count]
+
+
+def _marker(entry: Dict[str, Any]) -> Tuple[str, str]:
+    return (str(entry.get("playedAt") or ""), str(entry.get("gameId") or ""))
+
+
+class GameIndex:
+    def __init__(self) -> None:
+        self._lock = threading.Lock()
+        self._games: Dict[str, Dict[str, Any]] = {}
+        self._revs: Dict[str, str] = {}
+        self._tokens: Dict[str, Set[str]] = {}
+        self._postings: Dict[str, Set[str]] = {}
+        self._vocab: List[str] = []
+        self._vocab_dirty = False
+        self._by_creator: Dict[str, Set[str]] = {}
+        self._rooms: Dict[str, _RoomPlays] = {}
+        self.catalog_synced = False
+        # Catalog revision of the last sync_catalog; None once an upsert moved past it.
+        self.revision: Optional[str] = None
+
+    # --- catalog -----------------------------------------------------------
+
+    def _remove_game(self, game_id: str) -> None:
+        game = self._games.pop(game_id, None)
+        self._revs.pop(game_id, None)
+        for tok in self._tokens.pop(game_id, set()):
+            ids = self._postings.get(tok)
+            if ids is not None:
+                ids.discard(game_id)
+                if not ids:
+                    del self._postings[tok]
+                    self._vocab_dirty = True
+        if game is not None:
+            creator = str(game.get("creatorAvatarId") or "")
+            ids = self._by_creator.get(creator)
+            if ids is not None:
+                ids.discard(game_id)
+                if not ids:
+                    del self._by_creator[creator]
+        for room in self._rooms.values():
+            room.bucket_remove(game_id)
+
+    def _add_game(self, game: Dict[str, Any]) -> None:
+        game_id = str(game["id"])
+        self._games[game_id] = dict(game)
+        self._revs[game_id] = str(game.get("rev") or "")
+        tokens = set(tokenize(" ".join(str(game.get(k) or "") for k in ("title", "description", "author", "id"))))
+        self._tokens[game_id] = tokens
+        for tok in tokens:
+            if tok not in self._postings:
+                self._postings[tok] = set()
+                self._vocab_dirty = True
+            self._postings[tok].add(game_id)
+        self._by_creator.setdefault(str(game.get("creatorAvatarId") or ""), set()).add(game_id)
+        for room in self._rooms.values():
+            room.bucket_add(game_id)
+
+    def upsert(self, game: Dict[str, Any]) -> None:
+        with self._lock:
+            game_id = str(game["id"])
+            if game_id in self._games:
+                self._remove_game(game_id)
+            self._add_game(game)
+            self.revision = None
+
+    def sync_catalog(self, games: Iterable[Dict[str, Any]], revision: Optional[str] = None) -> None:
+        with self._lock:
+            if revision is not None and revision == self.revision:
+                return
+            seen = set()
+            for g in games:
+                game_id = str(g["id"])
+                seen.add(game_id)
+                if self._revs.get(game_id) == str(g.get("rev") or "") and game_id in self._games:
+                    continue
+                if game_id in self._games:
+                    self._remove_game(game_id)
+                self._add_game(g)
+            for game_id in [i for i in self._games if i not in seen]:
+                self._remove_game(game_id)
+            self.catalog_synced = True
+            self.revision = revision
+
+    def catalog(self) -> List[Dict[str, Any]]:
+        with self._lock:
+            return [dict(g) for g in self._games.values()]
+
+    # --- history -----------------------------------------------------------
+
+    def _apply_play(self, room: _RoomPlays, entry: Dict[str, Any]) -> None:
+        game_id = str(entry.get("gameId") or "")
+        if not game_id:
+            return
+        in_catalog = game_id in self._games
+        if in_catalog:
+            room.bucket_remove(game_id)
+        room.plays[game_id] = room.plays.get(game_id, 0) + 1
+        for r in entry.get("ratingsBySlot") or []:
+            if r == 1:
+                room.up[game_id] = room.up.get(game_id, 0) + 1
+            elif r == -1:
+                room.down[game_id] = room.down.get(game_id, 0) + 1
+        if in_catalog:
+            room.bucket_add(game_id)
+
+    def sync_history(self, room_name: str, history: List[Dict[str, Any]]) -> None:
+        with self._lock:
+            room = self._rooms.get(room_name)
+            stale = (
+                room is None
+                or len(history) < room.applied
+                or (room.applied and _marker(history[room.applied - 1]) != room.last_marker)
+            )
+            if stale:
+                room = self._rooms[room_name] = _RoomPlays()
+                for game_id in self._games:
+                    room.bucket_add(game_id)
+            assert room is not None
+            for entry in history[room.applied :]:
+                self._apply_play(room, entry)
+            room.applied = len(history)
+            room.last_marker = _marker(history[-1]) if history else None
+
+    def drop_room(self, room_name: str) -> None:
+        # Idle rooms are dropped; the next sync_history rebuilds from the session.
+        with self._lock:
+            self._rooms.pop(room_name, None)
+
+    # --- queries -----------------------------------------------------------
+
+    def _rating(self, room: Optional[_RoomPlays], game_id: str) -> float:
+        if room is None:
+            return 0.5
+        up = room.up.get(game_id, 0)
+        down = room.down.get(game_id, 0)
+        # Laplace-smoothed share of thumbs up, so one vote doesn't top the list.
+        return (up + 1) / (up + down + 2)
+
+    def _text_matches(self, q: str) -> Optional[Set[str]]:
+        tokens = tokenize(q)
+        if not tokens:
+            return None
+        if self._vocab_dirty:
+            self._vocab = sorted(self._postings)
+            self._vocab_dirty = False
+        result: Optional[Set[str]] = None
+        for i, tok in enumerate(tokens):
+            if i == len(tokens) - 1:
+                # Last token matches as a prefix, so typing "fla" finds "flappy".
+                ids: Set[str] = set()
+                j = bisect.bisect_left(self._vocab, tok)
+                while j < len(self._vocab) and self._vocab[j].startswith(tok):
+                    ids |= self._postings[self._vocab[j]]
+                    j += 1
+            else:
+                ids = self._postings.get(tok, set())
+            result = ids if result is None else result & ids
+            if not result:
+                return set()
+        return result
+
+    def _candidates(self, q: str, creator: str) -> Optional[Set[str]]:
+        # None means "every game" (no filter), so callers can take the O(1) paths.
+        result = self._text_matches(q) if q else None
+        if creator:
+            ids = self._by_creator.get(creator, set())
+            result = set(ids) if result is None else result & ids
+        return result
+
+    def search(
+        self,
+        room_name: str,
+        q: str = "",
+        creator: str = "",
+        unplayed: bool = False,
+        sort: str = "recent",
+        limit: Optional[int] = None,
+    ) -> Tuple[List[Dict[str, Any]], int]:
+        with self._lock:
+            room = self._rooms.get(room_name)
+            candidates = self._candidates(q, creator)
+            if unplayed:
+                zero = set(room.buckets.get(0, ())) if room is not None else set(self._games)
+                candidates = zero if candidates is None else candidates & zero
+            ids = list(self._games) if candidates is None else [i for i in candidates if i in self._games]
+            games = [self._games[i] for i in ids]
+            games.sort(key=lambda g: g.get("uploadedAt", ""), reverse=True)
+            if sort == "rating":
+                games.sort(key=lambda g: self._rating(room, g["id"]), reverse=True)
+            total = len(games)
+            if limit is not None:
+                games = games[: max(0, limit)]
+            return [dict(g) for g in games], total
+
+    def pick(
+        self,
+        room_name: str,
+        q: str = "",
+        creator: str = "",
+        exclude: str = "",
+        rng: Optional[random.Random] = None,
+    ) -> Optional[Dict[str, Any]]:
+        # Unplayed-first: choose uniformly among the games with the fewest plays in
+        # this room. Without filters that is an O(1) draw from the lowest bucket.
+        rng = rng or random.Random()
+        with self._lock:
+            room = self._rooms.get(room_name)
+            candidates = self._candidates(q, creator)
+            if room is None:
+                pool = [i for i in (self._games if candidates is None else candidates) if i in self._games and i != exclude]
+                return dict(self._games[rng.choice(pool)]) if pool else None
+
+            if candidates is None:
+                for count in sorted(room.buckets):
+                    bucket = room.buckets[count]
+                    if len(bucket) > 1 or (len(bucket) == 1 and exclude not in bucket):
+                        while True:
+                            game_id = bucket.choice(rng)
+                            if game_id != exclude:
+                                return dict(self._games[game_id])
+                return None
+
+            best: List[str] = []
+            best_count = None
+            for game_id in candidates:
+                if game_id not in self._games or game_id == exclude:
+                    continue
+                count = room.plays.get(game_id, 0)
+                if best_count is None or count < best_count:
+                    best, best_count = [game_id], count
+                elif count == best_count:
+                    best.append(game_id)
+            return dict(self._games[rng.choice(best)]) if best else None
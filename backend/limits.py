@@ -0,0 +1,77 @@
+from __future__ import annotations
+
+import threading
+import time
+from typing import Dict, Optional
+
+# Token buckets for upload admission: one bucket per key (client address or upload
+# token), refilled continuously at `rate_per_sec` up to `burst` tokens.
+
+
+class TokenBucket:
+    def __init__(self, rate_per_sec: float, burst: float, now: Optional[float] = None) -> None:
+        self.rate = rate_per_sec
+        self.burst = burst
+        self.tokens = burst
+        self.updated = time.monotonic() if now is None else now
+
+    def _refill(self, now: float) -> None:
+        if now > self.updated:
+            self.tokens = min(self.burst, self.tokens + (now - self.updated) * self.rate)
+            self.updated = now
+
+    def take(self, now: float) -> float:
+        # Returns 0 when a token was taken, else seconds until one is available.
+        self._refill(now)
+        if self.tokens >= 1:
+            self.tokens -= 1
+            return 0.0
+        if self.rate <= 0:
+            return float("inf")
+        return (1 - self.tokens) / self.rate
+
+    def full(self, now: float) -> bool:
+        self._refill(now)
+        return self.tokens >= self.burst
+
+
+class KeyedLimiter:
+    # Buckets that are full again carry no state worth keeping, so they are pruned
+    # whenever the table grows past `max_keys`; a flood of distinct keys can't grow
+    # memory without bound.
+
+    def __init__(self, rate_per_min: float, burst: float, max_keys: int = 4096) -> None:
+        self.rate_per_sec = max(0.0, rate_per_min) / 60.0
+        self.burst = max(1.0, burst)
+        self.max_keys = max_keys
+        self._buckets: Dict[str, TokenBucket] = {}
+        self._lock = threading.Lock()
+
+    @property
+    def enabled(self) -> bool:
+        return self.rate_per_sec > 0
+
+    def check(self, key: str, now: Optional[float] = None) -> float:
+        # 0 = allowed (and charged); otherwise the Retry-After delay in seconds.
+        if not self.enabled:
+            return 0.0
+        now = time.monotonic() if now is None else now
+        with self._lock:
+            bucket = self._buckets.get(key)
+            if bucket is None:
+                if len(self._buckets) >= self.max_keys:
+                    self._prune(now)
+                bucket = self._buckets[key] = TokenBucket(self.rate_per_sec, self.burst, now)
+            return bucket.take(now)
+
+    def _prune(self, now: float) -> None:
+        for key in [k for k, b in self._buckets.items() if b.full(now)]:
+            del self._buckets[key]
+        if len(self._buckets) >= self.max_keys:
+            # Everyone is mid-burst; drop the oldest-touched half rather than refuse new keys.
+            oldest = sorted(self._buckets, key=lambda k: self._buckets[k].updated)
+            for key in oldest[: len(oldest) // 2]:
+                del self._buckets[key]
+
+    def __len__(self) -> int:
+        return len(self._buckets)
@@ -0,0 +1,264 @@
+from __future__ import annotations
+
+import contextlib
+import contextvars
+import functools
+import heapq
+import inspect
+import itertools
+import os
+import random
+import sys
+import threading
+import time
+from collections import Counter
+from datetime import datetime, timezone
+from typing import Any, Callable, Dict, Iterator, List, Optional, Set, Tuple
+
+from fastapi.routing import APIRoute
+
+# Opt-in request profiling (`MARIBRO_PROFILE=1`).
+#
+# A sampled fraction of requests is watched by one background thread that reads
+# every thread's Python stack via `sys._current_frames()` at a fixed interval, so
+# the handlers themselves run at full speed (no tracing hooks). Named spans
+# (`span("list_games")`) add wall-clock timings for known hot spots. The slowest
+# N profiled requests are kept and can be dumped as collapsed stacks, the input
+# format of flamegraph.pl and speedscope.
+#
+# Each sample only goes to the request that owns the thread it came from: sync
+# handlers register their threadpool thread (`ThreadTaggingRoute`), and stacks on
+# the event loop thread belong to the request whose middleware frame they run under.
+
+_current: contextvars.ContextVar[Optional[Dict[str, float]]] = contextvars.ContextVar("maribro_profile_spans", default=None)
+_current_record: contextvars.ContextVar[Optional["_Record"]] = contextvars.ContextVar("maribro_profile_record", default=None)
+
+
+@contextlib.contextmanager
+def span(name: str) -> Iterator[None]:
+    # No-op unless the current request is being profiled.
+    spans = _current.get()
+    if spans is None:
+        yield
+        return
+    started = time.perf_counter()
+    try:
+        yield
+    finally:
+        spans[name] = spans.get(name, 0.0) + (time.perf_counter() - started) * 1000
+
+
+def timed(name: str) -> Callable[[Callable[..., Any]], Callable[..., Any]]:
+    def wrap(fn: Callable[..., Any]) -> Callable[..., Any]:
+        @functools.wraps(fn)
+        def inner(*args: Any, **kwargs: Any) -> Any:
+            with span(name):
+                return fn(*args, **kwargs)
+
+        return inner
+
+    return wrap
+
+
+@contextlib.contextmanager
+def collect_spans(enabled: bool = True) -> Iterator[Optional[Dict[str, float]]]:
+    # For work running elsewhere (e.g. an upload worker process): collect spans
+    # locally so they can be shipped back and merged with `add_spans`.
+    if not enabled:
+        yield None
+        return
+    spans: Dict[str, float] = {}
+    token = _current.set(spans)
+    try:
+        yield spans
+    finally:
+        _current.reset(token)
+
+
+def add_spans(extra: Optional[Dict[str, float]]) -> None:
+    spans = _current.get()
+    if spans is None or not extra:
+        return
+    for name, ms in extra.items():
+        spans[name] = spans.get(name, 0.0) + ms
+
+
+def tag_thread(fn: Callable[..., Any]) -> Callable[..., Any]:
+    # Marks the calling thread as working for the current profiled request while
+    # `fn` runs; the context (and so the record) is copied into the threadpool.
+    @functools.wraps(fn)
+    def inner(*args: Any, **kwargs: Any) -> Any:
+        rec = _current_record.get()
+        if rec is None:
+            return fn(*args, **kwargs)
+        ident = threading.get_ident()
+        rec.threads.add(ident)
+        try:
+            return fn(*args, **kwargs)
+        finally:
+            rec.threads.discard(ident)
+
+    inner.thread_tagged = True  # type: ignore[attr-defined]
+    return inner
+
+
+class ThreadTaggingRoute(APIRoute):
+    # Route class for apps behind `Profiler.middleware`: sync endpoints run in the
+    # threadpool, so wrap them with tag_thread (keeps the signature via __wrapped__).
+    def __init__(self, path: str, endpoint: Callable[..., Any], **kwargs: Any) -> None:
+        # include_router re-creates routes from their (already wrapped) endpoints.
+        if not inspect.iscoroutinefunction(endpoint) and not getattr(endpoint, "thread_tagged", False):
+            endpoint = tag_thread(endpoint)
+        super().__init__(path, endpoint, **kwargs)
+
+
+class _Record:
+    def __init__(self, method: str, path: str) -> None:
+        self.method = method
+        self.path = path
+        self.status = 0
+        self.started_at = datetime.now(timezone.utc).isoformat()
+        self.duration_ms = 0.0
+        self.spans: Dict[str, float] = {}
+        self.samples: Counter = Counter()
+        self.threads: Set[int] = set()  # threadpool threads currently running this request
+        self.frame_id = 0  # id() of this request's middleware frame on the event loop
+
+    def as_dict(self) -> Dict[str, Any]:
+        return {
+            "method": self.method,
+            "path": self.path,
+            "status": self.status,
+            "startedAt": self.started_at,
+            "durationMs": round(self.duration_ms, 2),
+            "spansMs": {k: round(v, 2) for k, v in sorted(self.spans.items())},
+            "samples": sum(self.samples.values()),
+        }
+
+
+class Profiler:
+    def __init__(self, sample_rate: float, keep: int, interval_ms: float, root: str) -> None:
+        self.sample_rate = max(0.0, min(1.0, sample_rate))
+        self.keep = max(1, keep)
+        self.interval = max(0.001, interval_ms / 1000)
+        self.root = os.path.abspath(root) + os.sep
+        self.seen = 0
+        self.profiled = 0
+        self._slowest: List[Tuple[float, int, _Record]] = []  # min-heap on duration
+        self._seq = itertools.count()
+        self._active: Dict[int, _Record] = {}
+        self._lock = threading.Lock()
+        self._wake = threading.Event()
+        self._thread: Optional[threading.Thread] = None
+
+    def _ensure_sampler(self) -> None:
+        if self._thread is None or not self._thread.is_alive():
+            self._thread = threading.Thread(target=self._run, name="maribro-profiler", daemon=True)
+            self._thread.start()
+
+    def _frame_name(self, frame: Any) -> str:
+        code = frame.f_code
+        return f"{os.path.basename(code.co_filename)}:{getattr(code, 'co_qualname', code.co_name)}"
+
+    def _stack(self, frame: Any, by_frame: Dict[int, _Record]) -> Tuple[Optional[str], Optional[_Record]]:
+        # Returns (collapsed stack, request whose middleware frame it runs under).
+        names: List[str] = []
+        ours = False
+        owner: Optional[_Record] = None
+        while frame is not None and len(names) < 128:
+            names.append(self._frame_name(frame))
+            ours = ours or frame.f_code.co_filename.startswith(self.root)
+            owner = owner or by_frame.get(id(frame))
+            frame = frame.f_back
+        # Only stacks that run through this project are request work; the rest are
+        # idle pool threads or the event loop waiting in select().
+        return (";".join(reversed(names)) if ours else None), owner
+
+    def _run(self) -> None:
+        me = threading.get_ident()
+        while True:
+            self._wake.wait()
+            time.sleep(self.interval)
+            with self._lock:
+                if not self._active:
+                    self._wake.clear()
+                    continue
+                by_thread = {ident: rec for rec in self._active.values() for ident in list(rec.threads)}
+                by_frame = {rec.frame_id: rec for rec in self._active.values()}
+            samples: List[Tuple[_Record, str]] = []
+            for ident, frame in sys._current_frames().items():
+                if ident == me:
+                    continue
+                stack, owner = self._stack(frame, by_frame)
+                owner = by_thread.get(ident) or owner
+                if stack is not None and owner is not None:
+                    samples.append((owner, stack))
+            with self._lock:
+                for rec, stack in samples:
+                    if id(rec) in self._active:
+                        rec.samples[stack] += 1
+
+    def _finish(self, key: int, rec: _Record) -> None:
+        with self._lock:
+            self._active.pop(key, None)
+            entry = (rec.duration_ms, next(self._seq), rec)
+            if len(self._slowest) < self.keep:
+                heapq.heappush(self._slowest, entry)
+            elif rec.duration_ms > self._slowest[0][0]:
+                heapq.heapreplace(self._slowest, entry)
+
+    def middleware(self, app: Any) -> Callable[..., Any]:
+        async def profiled_app(scope: Dict[str, Any], receive: Any, send: Any) -> None:
+            if scope["type"] != "http":
+                await app(scope, receive, send)
+                return
+            self.seen += 1
+            if random.random() >= self.sample_rate:
+                await app(scope, receive, send)
+                return
+            self.profiled += 1
+            rec = _Record(scope.get("method", ""), scope.get("path", ""))
+            key = id(rec)
+
+            async def send_wrapper(message: Dict[str, Any]) -> None:
+                if message["type"] == "http.response.start":
+                    rec.status = int(message.get("status", 0))
+                await send(message)
+
+            token = _current.set(rec.spans)
+            record_token = _current_record.set(rec)
+            rec.frame_id = id(sys._getframe())
+            with self._lock:
+                self._active[key] = rec
+                self._wake.set()
+            self._ensure_sampler()
+            started = time.perf_counter()
+            try:
+                await app(scope, receive, send_wrapper)
+            finally:
+                rec.duration_ms = (time.perf_counter() - started) * 1000
+                _current.reset(token)
+                _current_record.reset(record_token)
+                self._finish(key, rec)
+
+        return profiled_app
+
+    def slowest(self) -> List[_Record]:
+        with self._lock:
+            return [e[2] for e in sorted(self._slowest, key=lambda e: -e[0])]
+
+    def reset(self) -> None:
+        with self._lock:
+            self._slowest = []
+
+    def collapsed(self) -> str:
+        # One line per distinct stack: `request;frame;frame;... count`. Each request's
+        # stacks are rooted at `METHOD path`, so a flame graph splits by endpoint.
+        lines: Counter = Counter()
+        for rec in self.slowest():
+            root = f"{rec.method} {rec.path}".replace(";", ",").replace(" ", "_")
+            with self._lock:
+                samples = list(rec.samples.items())
+            for stack, n in samples:
+                lines[f"{root};{stack}"] += n
+        return "".join(f"{stack} {n}\n" for stack, n in sorted(lines.items()))
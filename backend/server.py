@@ -1,26 +1,100 @@
 from __future__ import annotations
 
-import json
+import asyncio
+import base64
+import binascii
+import contextlib
+import hashlib
+import math
+import mimetypes
 import os
+import multiprocessing
 import re
+import secrets
+import threading
+import time
+import zlib
+from concurrent.futures import ProcessPoolExecutor
+from concurrent.futures.process import BrokenProcessPool
 from datetime import datetime, timezone
 from pathlib import Path
-from typing import Any, Dict, List, Optional
+from typing import Any, AsyncIterator, Callable, Dict, List, Optional, Set, Tuple
 
-from fastapi import FastAPI, File, Form, Header, HTTPException, UploadFile
-from fastapi.responses import JSONResponse
+from fastapi import APIRouter, Depends, FastAPI, File, Form, Header, HTTPException, Request, UploadFile
+from fastapi.concurrency import run_in_threadpool
+from fastapi.responses import FileResponse, JSONResponse, PlainTextResponse, Response
+from fastapi.routing import APIRoute
 from fastapi.staticfiles import StaticFiles
 
+from .game_index import GameIndex
+from .limits import KeyedLimiter
+from .profiling import Profiler, ThreadTaggingRoute, add_spans, collect_spans, span, timed
+from .storage import (
+    JsonFileStore,
+    SqliteStore,
+    dumps_json,
+    loads_json,
+    write_bytes_atomic,
+    write_json_atomic,
+    write_text_atomic,
+)
+
+try:
+    import zstandard
+except Exception:  # optional: zstd-encoded uploads are rejected without it
+    zstandard = None
+
 
 ROOT = Path(__file__).resolve().parent.parent
 PUBLIC_DIR = ROOT / "public"
 GAMES_DIR = ROOT / "games"
 DATA_DIR = ROOT / "data"
 SESSION_PATH = DATA_DIR / "session.json"
+ROOMS_DIR = DATA_DIR / "rooms"
+SQLITE_PATH = DATA_DIR / "maribro.sqlite3"
+CATALOG_SNAPSHOT_PATH = DATA_DIR / "catalog.json"
+UPLOADS_INDEX_PATH = DATA_DIR / "uploads.json"
+ASSETS_DIR = DATA_DIR / "assets"
+RECORDINGS_DIR = DATA_DIR / "recordings"
+# Versioned by rewrite rules: bumping the suffix regenerates every served copy.
+SERVED_GAMES_DIR = DATA_DIR / "served" / "v2"
 AVATARS_PATH = PUBLIC_DIR / "avatars" / "avatars.json"
 
 MAX_GAME_BYTES = 20 * 1024 * 1024
 DEFAULT_UPLOAD_TOKEN = "maribro-upload"
+DEFAULT_ROOM = "default"
+# JSON storage only: rooms untouched for this long are dropped from memory.
+ROOM_IDLE_EVICT_SEC = float(os.getenv("MARIBRO_ROOM_IDLE_SEC", "900"))
+# Upload ingest (decode, validate, rewrite, write) runs in this many worker
+# processes -- the regex validation holds the GIL for seconds on a 20MB file, so
+# threads would still stall the event loop. At most UPLOAD_QUEUE_DEPTH more uploads
+# wait; the rest get `429 busy` with a Retry-After estimate.
+UPLOAD_WORKERS = max(1, int(os.getenv("MARIBRO_UPLOAD_WORKERS", "2")))
+UPLOAD_QUEUE_DEPTH = max(0, int(os.getenv("MARIBRO_UPLOAD_QUEUE", "4")))
+# Upload rate limits (token buckets; a rate of 0 disables that limit). Per client
+# address, and per upload token since everyone shares the default one.
+UPLOAD_RATE_PER_CLIENT = float(os.getenv("MARIBRO_UPLOAD_RATE_PER_CLIENT", "6"))  # per minute
+UPLOAD_BURST_PER_CLIENT = float(os.getenv("MARIBRO_UPLOAD_BURST_PER_CLIENT", "3"))
+UPLOAD_RATE_PER_TOKEN = float(os.getenv("MARIBRO_UPLOAD_RATE_PER_TOKEN", "30"))  # per minute
+UPLOAD_BURST_PER_TOKEN = float(os.getenv("MARIBRO_UPLOAD_BURST_PER_TOKEN", "10"))
+# Session routes drive the running game; an upload waits up to this long for them
+# to drain before starting, and its worker processes run at this nice level.
+UPLOAD_YIELD_SEC = float(os.getenv("MARIBRO_UPLOAD_YIELD_SEC", "1.0"))
+UPLOAD_WORKER_NICE = int(os.getenv("MARIBRO_UPLOAD_NICE", "10"))
+# Opt-in sampling profiler (see backend/profiling.py and GET /api/admin/profile).
+PROFILE_ENABLED = os.getenv("MARIBRO_PROFILE", "").strip().lower() in ("1", "true", "yes")
+PROFILE_SAMPLE = float(os.getenv("MARIBRO_PROFILE_SAMPLE", "0.1"))  # fraction of requests
+PROFILE_KEEP = int(os.getenv("MARIBRO_PROFILE_KEEP", "20"))  # slowest N requests kept
+PROFILE_INTERVAL_MS = float(os.getenv("MARIBRO_PROFILE_INTERVAL_MS", "5"))
+# Write data/*.json without indentation (smaller, faster to save; less readable).
+COMPACT_JSON = os.getenv("MARIBRO_COMPACT_JSON", "").strip().lower() in ("1", "true", "yes")
+# Input recordings posted with record_game (SDK format, see maribro-sdk.js).
+MAX_RECORDING_BYTES = 256 * 1024
+# Client-generated round ids double as history entry ids (and recording file names).
+ROUND_ID_RE = re.compile(r"[A-Za-z0-9_-]{8,64}")
+MAX_BATCH_ROUNDS = 50
+# Inline data: URIs at least this large (decoded) are moved into the asset store.
+MIN_EXTRACTED_ASSET_BYTES = 4 * 1024
 
 
 def _now_iso() -> str:
@@ -31,13 +105,19 @@ def _ok(payload: Dict[str, Any]) -> Dict[str, Any]:
     return {"ok": True, **payload}
 
 
-def _err(code: str, message: str, status_code: int = 400) -> HTTPException:
+def _err(code: str, message: str, status_code: int = 400, headers: Optional[Dict[str, str]] = None) -> HTTPException:
     return HTTPException(
         status_code=status_code,
         detail={"ok": False, "error": {"code": code, "message": message}},
+        headers=headers,
     )
 
 
+def _check_token(token: Optional[str]) -> None:
+    if (token or "").strip() != _expected_upload_token():
+        raise _err("invalid_upload_token", "missing or invalid upload token", status_code=401)
+
+
 def _expected_upload_token() -> str:
     token = os.getenv("MARIBRO_UPLOAD_TOKEN", DEFAULT_UPLOAD_TOKEN).strip()
     return token or DEFAULT_UPLOAD_TOKEN
@@ -47,27 +127,99 @@ def _ensure_dirs() -> None:
     PUBLIC_DIR.mkdir(parents=True, exist_ok=True)
     GAMES_DIR.mkdir(parents=True, exist_ok=True)
     DATA_DIR.mkdir(parents=True, exist_ok=True)
+    ASSETS_DIR.mkdir(parents=True, exist_ok=True)
+    SERVED_GAMES_DIR.mkdir(parents=True, exist_ok=True)
+    ROOMS_DIR.mkdir(parents=True, exist_ok=True)
+    RECORDINGS_DIR.mkdir(parents=True, exist_ok=True)
     (PUBLIC_DIR / "avatars").mkdir(parents=True, exist_ok=True)
 
 
 def _load_json(path: Path) -> Any:
-    return json.loads(path.read_text(encoding="utf-8"))
+    return loads_json(path.read_bytes())
 
 
 def _write_json(path: Path, obj: Any) -> None:
-    path.parent.mkdir(parents=True, exist_ok=True)
-    path.write_text(json.dumps(obj, indent=2, ensure_ascii=False) + "\n", encoding="utf-8")
+    write_json_atomic(path, obj, compact=COMPACT_JSON)
+
+
+def _json_response(payload: Dict[str, Any]) -> Response:
+    return Response(content=dumps_json(payload), media_type="application/json")
+
+
+# Encoded `_ok(...)` bodies keyed by resource, each tagged with the revision it was
+# built from. Lobbies poll the catalog, avatars and session every few seconds;
+# while nothing changed they get the same bytes back without re-encoding.
+_encoded_responses: Dict[str, Tuple[Any, bytes]] = {}
+_encoded_responses_lock = threading.Lock()
+
+
+# Per-room state kept outside the store (encoded responses, the room's half of
+# GAME_INDEX and its per-game stats) is tracked here and dropped after
+# ROOM_IDLE_EVICT_SEC without use.
+_rooms_last_used: Dict[str, float] = {}
+_rooms_swept_at = 0.0
+# room -> (session revision, byGameId stats); GAME_INDEX holds that room's history
+# as of the same revision.
+_room_game_stats: Dict[str, Tuple[str, Dict[str, Any]]] = {}
+
+
+def _touch_room(room: str) -> None:
+    global _rooms_swept_at
+    now = time.monotonic()
+    _rooms_last_used[room] = now
+    if now - _rooms_swept_at < 60:
+        return
+    _rooms_swept_at = now
+    for name, used in list(_rooms_last_used.items()):
+        if now - used > ROOM_IDLE_EVICT_SEC:
+            _rooms_last_used.pop(name, None)
+            _room_game_stats.pop(name, None)
+            GAME_INDEX.drop_room(name)
+            with _encoded_responses_lock:
+                _encoded_responses.pop(f"games:{name}", None)
+                _encoded_responses.pop(f"session:{name}", None)
+
+
+def _room_key(room: str, exists: bool) -> Optional[str]:
+    # None for a room that doesn't exist yet: every such room reads the same blank
+    # session, so it shares one cache entry and gets no index state of its own.
+    if not exists:
+        return None
+    _touch_room(room)
+    return room
+
+
+def _cached_ok(key: str, revision: Any, build: Callable[[], Dict[str, Any]]) -> Response:
+    hit = _encoded_responses.get(key)
+    if hit is not None and hit[0] == revision:
+        body = hit[1]
+    else:
+        body = dumps_json(_ok(build()))
+        with _encoded_responses_lock:
+            _encoded_responses[key] = (revision, body)
+    return Response(content=body, media_type="application/json")
+
+
+_avatars_cache: Tuple[int, List[Dict[str, Any]]] = (-1, [])
 
 
 def _load_avatars_index() -> List[Dict[str, Any]]:
-    if not AVATARS_PATH.exists():
+    global _avatars_cache
+    try:
+        mtime_ns = AVATARS_PATH.stat().st_mtime_ns
+    except FileNotFoundError:
         return []
+    # Re-read only when avatars.json changes; this is hit by every upload and players update.
+    if _avatars_cache[0] == mtime_ns:
+        return _avatars_cache[1]
     data = _load_json(AVATARS_PATH)
+    avatars: List[Dict[str, Any]] = []
     if isinstance(data, dict) and isinstance(data.get("avatars"), list):
-        return data["avatars"]
-    if isinstance(data, list):
-        return data
-    return []
+        avatars = data["avatars"]
+    elif isinstance(data, list):
+        avatars = data
+    _avatars_cache = (mtime_ns, avatars)
+    return avatars
 
 
 def _is_known_avatar(avatar_id: str) -> bool:
@@ -88,28 +240,45 @@ def _default_session() -> Dict[str, Any]:
         ],
         "scoreboardByAvatarId": {},
         "history": [],
+        "gameStats": {"applied": 0, "byGameId": {}},
     }
 
 
-def _load_session() -> Dict[str, Any]:
-    if not SESSION_PATH.exists():
-        sess = _default_session()
-        _write_json(SESSION_PATH, sess)
-        return sess
-    try:
-        data = _load_json(SESSION_PATH)
-        if isinstance(data, dict) and data.get("version") == 1:
-            return data
-    except Exception:
-        pass
-    sess = _default_session()
-    _write_json(SESSION_PATH, sess)
-    return sess
+def _sanitize_room(name: str) -> str:
+    name = (name or "").strip()
+    if len(name) > 48 or not re.fullmatch(r"[a-z0-9]+(?:-[a-z0-9]+)*", name):
+        raise _err("bad_room", "room must be kebab-case (letters/numbers/dashes, max 48 chars)")
+    return name
+
 
+def _room_from_path(request: Request) -> str:
+    return _sanitize_room(request.path_params.get("room") or DEFAULT_ROOM)
 
-def _save_session(sess: Dict[str, Any]) -> None:
-    sess["updatedAt"] = _now_iso()
-    _write_json(SESSION_PATH, sess)
+
+def _make_store() -> Any:
+    backend = os.getenv("MARIBRO_STORAGE", "json").strip().lower()
+    if backend == "sqlite":
+        # Multi-process safe: use this to run `uvicorn --workers N`.
+        return SqliteStore(
+            Path(os.getenv("MARIBRO_SQLITE_PATH", "") or SQLITE_PATH),
+            default_session=_default_session,
+            legacy_default_path=SESSION_PATH,
+            legacy_rooms_dir=ROOMS_DIR,
+            default_room=DEFAULT_ROOM,
+            legacy_uploads_path=UPLOADS_INDEX_PATH,
+        )
+    if backend != "json":
+        raise RuntimeError(f"unknown MARIBRO_STORAGE backend: {backend!r} (expected json or sqlite)")
+    return JsonFileStore(
+        SESSION_PATH,
+        ROOMS_DIR,
+        default_session=_default_session,
+        default_room=DEFAULT_ROOM,
+        idle_evict_sec=ROOM_IDLE_EVICT_SEC,
+        catalog_path=CATALOG_SNAPSHOT_PATH,
+        compact_json=COMPACT_JSON,
+        uploads_path=UPLOADS_INDEX_PATH,
+    )
 
 
 META_RE = re.compile(
@@ -171,6 +340,7 @@ def _sanitize_filename(filename: str) -> str:
     return filename
 
 
+@timed("validate")
 def _validate_game_html_bytes(raw: bytes) -> str:
     if len(raw) > MAX_GAME_BYTES:
         raise _err("too_large", f"game file must be <= {MAX_GAME_BYTES} bytes")
@@ -206,22 +376,213 @@ def _validate_game_html_bytes(raw: bytes) -> str:
     return html
 
 
+def _decode_upload_bytes(raw: bytes, encoding: Optional[str]) -> bytes:
+    # Undo the upload's transfer compression; MAX_GAME_BYTES applies to the decoded size.
+    enc = (encoding or "").strip().lower()
+    if enc in ("", "identity"):
+        return raw
+    if len(raw) > MAX_GAME_BYTES:
+        raise _err("too_large", f"game file must be <= {MAX_GAME_BYTES} bytes")
+
+    if enc in ("gzip", "x-gzip"):
+        d = zlib.decompressobj(16 + zlib.MAX_WBITS)
+        try:
+            out = d.decompress(raw, MAX_GAME_BYTES + 1)
+        except zlib.error as e:
+            raise _err("bad_encoding", f"invalid gzip body: {e}")
+        if len(out) > MAX_GAME_BYTES or d.unconsumed_tail:
+            raise _err("too_large", f"game file must be <= {MAX_GAME_BYTES} bytes (decompressed)")
+        if not d.eof:
+            raise _err("bad_encoding", "truncated gzip body")
+        return out
+
+    if enc == "zstd":
+        if zstandard is None:
+            raise _err("unsupported_encoding", "zstd uploads need the `zstandard` package on the host", 415)
+        chunks: List[bytes] = []
+        total = 0
+        try:
+            with zstandard.ZstdDecompressor().stream_reader(raw) as reader:
+                while total <= MAX_GAME_BYTES:
+                    chunk = reader.read(MAX_GAME_BYTES + 1 - total)
+                    if not chunk:
+                        break
+                    chunks.append(chunk)
+                    total += len(chunk)
+        except zstandard.ZstdError as e:
+            raise _err("bad_encoding", f"invalid zstd body: {e}")
+        if total > MAX_GAME_BYTES:
+            raise _err("too_large", f"game file must be <= {MAX_GAME_BYTES} bytes (decompressed)")
+        return b"".join(chunks)
+
+    raise _err("unsupported_encoding", f"unsupported content encoding: {enc}", 415)
+
+
+def _record_upload_hash(sha256: str, filename: str, creator_avatar_id: str) -> None:
+    # sha256 of the uploaded (decoded) bytes -> filename; kept by the store so every
+    # worker sees (and safely updates) the same index.
+    STORE.upload_record(sha256, filename, creator_avatar_id)
+
+
+def _lookup_upload_hash(sha256: str) -> List[Dict[str, str]]:
+    entries = STORE.upload_matches(sha256)
+    return [e for e in entries if (GAMES_DIR / str(e.get("filename") or "")).is_file()]
+
+
+# Only whole URIs in markup are rewritten: src/href/poster attribute values and CSS
+# url(...). <script> bodies are never touched, since code may take a data: string
+# apart (e.g. atob(s.split(",")[1])) and would break if it pointed at /assets/.
+DATA_URI_RE = re.compile(
+    r"""(?P<pre>\b(?:src|href|poster|xlink:href)\s*=\s*["']|url\(\s*["']?)\s*data:(?P<mime>[\w.+-]+/[\w.+-]+)(?:;[\w.+-]+=[\w.+-]+)*;base64,(?P<b64>[A-Za-z0-9+/]+={0,2})\s*(?=["')])""",
+    re.IGNORECASE,
+)
+SCRIPT_BLOCK_RE = re.compile(r"<script\b[^>]*>.*?</script\s*>", re.IGNORECASE | re.DOTALL)
+ASSET_NAME_RE = re.compile(r"[0-9a-f]{64}\.[a-z0-9]+")
+
+# filename -> (st_mtime_ns, st_size, path actually served for that version)
+_served_games: Dict[str, Tuple[int, int, Path]] = {}
+
+
+def _store_asset(data: bytes, mime: str) -> str:
+    ext = (mimetypes.guess_extension(mime.lower()) or ".bin").lstrip(".")
+    name = f"{hashlib.sha256(data).hexdigest()}.{ext}"
+    path = ASSETS_DIR / name
+    if not path.exists():
+        write_bytes_atomic(path, data)
+    return name
+
+
+def _extract_data_uri_assets(html: str) -> Tuple[str, int]:
+    count = 0
+
+    def repl(m: "re.Match[str]") -> str:
+        nonlocal count
+        b64 = m.group("b64")
+        if len(b64) * 3 // 4 < MIN_EXTRACTED_ASSET_BYTES:
+            return m.group(0)
+        try:
+            data = base64.b64decode(b64, validate=True)
+        except Exception:
+            return m.group(0)
+        count += 1
+        return f"{m.group('pre')}/assets/{_store_asset(data, m.group('mime'))}"
+
+    parts: List[str] = []
+    pos = 0
+    for script in SCRIPT_BLOCK_RE.finditer(html):
+        parts.append(DATA_URI_RE.sub(repl, html[pos : script.start()]))
+        parts.append(script.group(0))
+        pos = script.end()
+    parts.append(DATA_URI_RE.sub(repl, html[pos:]))
+    return "".join(parts), count
+
+
+def _served_game_path(path: Path) -> Path:
+    # The uploaded file in games/ stays untouched; when it inlines large assets we
+    # serve a rewritten copy from data/served/v2/ that points at /assets/<hash> instead.
+    st = path.stat()
+    cached = _served_games.get(path.name)
+    if cached and cached[0] == st.st_mtime_ns and cached[1] == st.st_size and cached[2].exists():
+        return cached[2]
+
+    served = SERVED_GAMES_DIR / path.name
+    if served.exists() and served.stat().st_mtime_ns >= st.st_mtime_ns:
+        _served_games[path.name] = (st.st_mtime_ns, st.st_size, served)
+        return served
+
+    rewritten, count = _extract_data_uri_assets(path.read_text(encoding="utf-8", errors="replace"))
+    if count:
+        write_text_atomic(served, rewritten)
+    else:
+        served.unlink(missing_ok=True)
+        served = path
+    _served_games[path.name] = (st.st_mtime_ns, st.st_size, served)
+    return served
+
+
+@timed("list_games")
 def _list_games() -> List[Dict[str, Any]]:
     games: List[Dict[str, Any]] = []
+    # Parsed metadata is cached in the store keyed by file rev (mtime + size) and
+    # content hash, so only new or changed files are read, and only edited ones parsed.
+    known = STORE.catalog_entries()
+    seen = set()
+    put: Dict[str, Tuple[str, str, Dict[str, Any]]] = {}
     for p in sorted(GAMES_DIR.glob("*.html")):
         if p.name.startswith("_"):
             continue
         try:
-            html = p.read_text(encoding="utf-8", errors="replace")
+            st = p.stat()
+        except Exception:
+            continue
+        seen.add(p.name)
+        rev = f"{st.st_mtime_ns:x}-{st.st_size:x}"
+        cached = known.get(p.name)
+        if cached and cached[0] == rev:
+            games.append(dict(cached[2]))
+            continue
+        try:
+            raw = p.read_bytes()
         except Exception:
             continue
-        uploaded_at = datetime.fromtimestamp(p.stat().st_mtime, tz=timezone.utc).isoformat()
-        games.append(_get_game_metadata(p.name, html, uploaded_at))
+        sha256 = hashlib.sha256(raw).hexdigest()
+        uploaded_at = datetime.fromtimestamp(st.st_mtime, tz=timezone.utc).isoformat()
+        if cached and cached[1] == sha256:
+            # Touched or copied but unchanged: keep the parsed metadata.
+            game = {**cached[2], "uploadedAt": uploaded_at}
+        else:
+            game = _get_game_metadata(p.name, raw.decode("utf-8", errors="replace"), uploaded_at)
+        game["rev"] = rev
+        put[p.name] = (rev, sha256, game)
+        games.append(game)
+    gone = [f for f in known if f not in seen]
+    if put or gone:
+        STORE.catalog_update(put, gone)
     # newest first
     games.sort(key=lambda g: g.get("uploadedAt", ""), reverse=True)
+    # Every listing keeps the search/pick index current (a no-op while the revision
+    # is unchanged), so queries don't have to list games/ themselves.
+    GAME_INDEX.sync_catalog(games, _catalog_revision(games))
+    return games
+
+
+def _snapshot_games() -> List[Dict[str, Any]]:
+    games = [dict(e[2]) for e in STORE.catalog_entries().values()]
+    games.sort(key=lambda g: g.get("uploadedAt", ""), reverse=True)
     return games
 
 
+# Set once the startup reconciliation of the saved catalog against games/ is done;
+# until then /api/games answers from the snapshot and reports `stale: true`.
+_catalog_reconciled = threading.Event()
+
+
+def _current_games() -> Tuple[List[Dict[str, Any]], bool]:
+    if not _catalog_reconciled.is_set():
+        games = _snapshot_games()
+        if games:
+            return games, True
+        # Nothing saved yet (first run): there is nothing faster to answer with.
+        _reconcile_catalog()
+    return _list_games(), False
+
+
+def _reconcile_catalog() -> None:
+    try:
+        _list_games()
+    finally:
+        _catalog_reconciled.set()
+
+
+def _catalog_revision(games: List[Dict[str, Any]]) -> str:
+    # Changes whenever any game is added, removed or re-uploaded; the lobby's
+    # service worker uses it to decide when to revalidate its cached games.
+    h = hashlib.sha256()
+    for g in sorted(games, key=lambda g: g["filename"]):
+        h.update(f"{g['filename']}:{g.get('rev', '')}\n".encode("utf-8"))
+    return h.hexdigest()[:16]
+
+
 def _clamp_score(x: Any) -> int:
     try:
         v = float(x)
@@ -232,6 +593,101 @@ def _clamp_score(x: Any) -> int:
     return int(round(max(0.0, min(10.0, v))))
 
 
+def _new_game_stats() -> Dict[str, Any]:
+    return {
+        "plays": 0,
+        "thumbsUp": 0,
+        "thumbsDown": 0,
+        "scoreCount": 0,
+        "scoreSum": 0,
+        "scoreMean": 0.0,
+        # scoreDistribution[k] = number of player results with score k (0..10)
+        "scoreDistribution": [0] * 11,
+        "lastPlayedAt": "",
+    }
+
+
+def _apply_game_stats(by_game: Dict[str, Any], entry: Dict[str, Any]) -> None:
+    game_id = str(entry.get("gameId") or "")
+    if not game_id:
+        return
+    st = by_game.get(game_id) or _new_game_stats()
+    st["plays"] += 1
+    for r in entry.get("ratingsBySlot") or []:
+        if r == 1:
+            st["thumbsUp"] += 1
+        elif r == -1:
+            st["thumbsDown"] += 1
+    scores = entry.get("scoresBySlot") or []
+    avatars = entry.get("avatarIdsBySlot")
+    for slot, pts in enumerate(scores):
+        # Older entries don't say which slots were occupied; count every slot then.
+        if avatars is not None and not (slot < len(avatars) and avatars[slot]):
+            continue
+        k = _clamp_score(pts)
+        st["scoreCount"] += 1
+        st["scoreSum"] += k
+        st["scoreDistribution"][k] += 1
+    if st["scoreCount"]:
+        st["scoreMean"] = round(st["scoreSum"] / st["scoreCount"], 2)
+    st["lastPlayedAt"] = str(entry.get("playedAt") or st["lastPlayedAt"])
+    by_game[game_id] = st
+
+
+def _rebuild_game_stats(history: List[Dict[str, Any]]) -> Dict[str, Any]:
+    by_game: Dict[str, Any] = {}
+    for entry in history:
+        _apply_game_stats(by_game, entry)
+    return {"applied": len(history), "byGameId": by_game}
+
+
+def _game_stats(sess: Dict[str, Any]) -> Dict[str, Any]:
+    # Per-game aggregates are kept in the session and updated per record_game; they
+    # are rebuilt from history when missing or out of step (older session files,
+    # history edited by hand). Read-only callers get a rebuilt copy without saving it.
+    stats = sess.get("gameStats")
+    history = sess.get("history") or []
+    if isinstance(stats, dict) and stats.get("applied") == len(history) and isinstance(stats.get("byGameId"), dict):
+        return stats
+    return _rebuild_game_stats(history)
+
+
+def _with_stats(games: List[Dict[str, Any]], by_game: Dict[str, Any]) -> List[Dict[str, Any]]:
+    empty = _new_game_stats()
+    return [{**g, "stats": by_game.get(g["id"], empty)} for g in games]
+
+
+def _decode_input_recording(value: Any) -> Tuple[bytes, int]:
+    # Returns (raw bytes, frame count). Only the header is checked; the frame stream
+    # is opaque to the host and decoded by the SDK on replay.
+    if not isinstance(value, str):
+        raise _err("bad_body", "inputRecording must be a base64 string")
+    try:
+        raw = base64.b64decode(value, validate=True)
+    except (binascii.Error, ValueError):
+        raise _err("bad_body", "inputRecording is not valid base64")
+    if len(raw) > MAX_RECORDING_BYTES:
+        raise _err("too_large", f"inputRecording must be <= {MAX_RECORDING_BYTES} bytes")
+    if len(raw) < 8 or raw[:3] != b"MR\x01":
+        raise _err("bad_body", "inputRecording is not a Maribro input recording")
+    return raw, int.from_bytes(raw[4:8], "little")
+
+
+def _recording_path(room: str, entry_id: str) -> Path:
+    # Round ids are client-chosen and only unique within one room's history.
+    return RECORDINGS_DIR / room / f"{entry_id}.mrec.z"
+
+
+def _save_recording(room: str, rnd: Dict[str, Any]) -> None:
+    # Only called for rounds that were newly applied, so a retried or forged round
+    # never replaces the bytes its history entry describes.
+    if rnd["recordingData"] is None:
+        return
+    path = _recording_path(room, rnd["roundId"])
+    path.parent.mkdir(parents=True, exist_ok=True)
+    write_bytes_atomic(path, rnd["recordingData"])
+
+
 def _creator_bonus_from_ratings(ratings_by_slot: Optional[List[int]]) -> int:
     if not ratings_by_slot:
         return 0
@@ -243,24 +699,332 @@ def _creator_bonus_from_ratings(ratings_by_slot: Optional[List[int]]) -> int:
     return int(round(10 * pos / votes))
 
 
+_upload_executor: Optional[ProcessPoolExecutor] = None
+_upload_slots: Optional[asyncio.Semaphore] = None
+_upload_waiting = 0
+_upload_running = 0
+_upload_job_sec = 2.0  # moving average of job duration, for Retry-After estimates
+_session_in_flight = 0
+
+_client_limiter = KeyedLimiter(UPLOAD_RATE_PER_CLIENT, UPLOAD_BURST_PER_CLIENT)
+_token_limiter = KeyedLimiter(UPLOAD_RATE_PER_TOKEN, UPLOAD_BURST_PER_TOKEN)
+_upload_counters: Dict[str, int] = {
+    "accepted": 0,
+    "completed": 0,
+    "failed": 0,
+    "rejected_rate_client": 0,
+    "rejected_rate_token": 0,
+    "rejected_busy": 0,
+    "yielded_to_session": 0,
+}
+
+
+def _init_upload_worker(nice: int) -> None:
+    # Lower the CPU priority of upload workers so the server process (and the
+    # session routes it serves) wins whenever both want a core.
+    if nice > 0 and hasattr(os, "nice"):
+        try:
+            os.nice(nice)
+        except OSError:
+            pass
+
+
+def _get_upload_executor() -> ProcessPoolExecutor:
+    global _upload_executor
+    if _upload_executor is None:
+        # spawn (not fork): the host process has live threads and open connections.
+        _upload_executor = ProcessPoolExecutor(
+            max_workers=UPLOAD_WORKERS,
+            mp_context=multiprocessing.get_context("spawn"),
+            initializer=_init_upload_worker,
+            initargs=(UPLOAD_WORKER_NICE,),
+        )
+    return _upload_executor
+
+
+def _busy_retry_after() -> int:
+    # Roughly when a worker frees up for a request at the back of the queue.
+    return max(1, math.ceil(_upload_job_sec * (_upload_waiting + 1) / UPLOAD_WORKERS))
+
+
+async def _run_upload_job(fn: Any, *args: Any) -> Any:
+    # Bounded executor with backpressure: UPLOAD_WORKERS jobs run, UPLOAD_QUEUE_DEPTH
+    # wait their turn, and anything beyond that is turned away instead of piling up.
+    global _upload_executor, _upload_slots, _upload_waiting, _upload_running, _upload_job_sec
+    if _upload_slots is None:
+        _upload_slots = asyncio.Semaphore(UPLOAD_WORKERS)
+    if _upload_slots.locked() and _upload_waiting >= UPLOAD_QUEUE_DEPTH:
+        _upload_counters["rejected_busy"] += 1
+        retry = _busy_retry_after()
+        raise _err(
+            "busy",
+            f"host is busy processing other uploads; retry in {retry}s",
+            status_code=429,
+            headers={"Retry-After": str(retry)},
+        )
+    _upload_counters["accepted"] += 1
+    _upload_waiting += 1
+    try:
+        await _upload_slots.acquire()
+    finally:
+        _upload_waiting -= 1
+    try:
+        # Let in-flight session requests (scores, players) finish first.
+        deadline = time.monotonic() + UPLOAD_YIELD_SEC
+        if _session_in_flight:
+            _upload_counters["yielded_to_session"] += 1
+        while _session_in_flight and time.monotonic() < deadline:
+            await asyncio.sleep(0.02)
+        _upload_running += 1
+        started = time.monotonic()
+        try:
+            with span("upload_job"):
+                status, result, spans = await asyncio.get_running_loop().run_in_executor(
+                    _get_upload_executor(), _call_upload_job, fn, *args
+                )
+            add_spans(spans)
+        finally:
+            _upload_running -= 1
+        _upload_job_sec = 0.8 * _upload_job_sec + 0.2 * (time.monotonic() - started)
+    except BrokenProcessPool:
+        _upload_executor = None  # a worker died (e.g. OOM); start a fresh pool next time
+        _upload_counters["failed"] += 1
+        raise _err("upload_failed", "upload worker crashed; retry", status_code=500)
+    finally:
+        _upload_slots.release()
+    if status == "error":
+        _upload_counters["failed"] += 1
+        raise HTTPException(status_code=result["status_code"], detail=result["detail"])
+    _upload_counters["completed"] += 1
+    return result
+
+
+def _rate_limited(which: str, wait: float) -> HTTPException:
+    _upload_counters[f"rejected_rate_{which}"] += 1
+    retry = max(1, math.ceil(wait))
+    return _err(
+        "rate_limited",
+        f"too many uploads from this {which}; retry in {retry}s",
+        status_code=429,
+        headers={"Retry-After": str(retry)},
+    )
+
+
+def _check_upload_rate(client: str, token: Optional[str]) -> None:
+    wait = _client_limiter.check(client)
+    if wait:
+        raise _rate_limited("client", wait)
+    if token and token == _expected_upload_token():
+        wait = _token_limiter.check(token)
+        if wait:
+            raise _rate_limited("token", wait)
+
+
+SESSION_ROUTE_RE = re.compile(r"^/api/(?:rooms/[^/]+/)?session(?:/|$)")
+
+
+def _client_address(scope: Dict[str, Any], headers: Dict[bytes, bytes]) -> str:
+    peer = (scope.get("client") or ("",))[0] or "unknown"
+    # Behind the local cloudflared tunnel every request arrives from loopback; only
+    # then trust the forwarded client address.
+    if peer in ("127.0.0.1", "::1"):
+        fwd = headers.get(b"cf-connecting-ip") or (headers.get(b"x-forwarded-for") or b"").split(b",")[0]
+        if fwd.strip():
+            return fwd.strip().decode("latin-1")
+    return peer
+
+
+class _AdmissionMiddleware:
+    # Plain ASGI (no per-request Request/Response wrapping): counts in-flight session
+    # requests so uploads can yield to them, and rate-limits uploads before their
+    # (up to 20MB) multipart body is read.
+
+    def __init__(self, app: Any) -> None:
+        self.app = app
+
+    async def __call__(self, scope: Dict[str, Any], receive: Any, send: Any) -> None:
+        global _session_in_flight
+        if scope["type"] != "http":
+            await self.app(scope, receive, send)
+            return
+        path = scope.get("path", "")
+        if SESSION_ROUTE_RE.match(path):
+            _session_in_flight += 1
+            try:
+                await self.app(scope, receive, send)
+            finally:
+                _session_in_flight -= 1
+            return
+        if scope.get("method") == "POST" and path == "/api/games":
+            headers = dict(scope.get("headers") or [])
+            token = headers.get(b"x-maribro-token", b"").decode("latin-1").strip()
+            try:
+                _check_upload_rate(_client_address(scope, headers), token)
+            except HTTPException as e:
+                await JSONResponse(status_code=e.status_code, content=e.detail, headers=e.headers)(scope, receive, send)
+                return
+        await self.app(scope, receive, send)
+
+
+def _call_upload_job(fn: Any, *args: Any) -> Tuple[str, Any, Optional[Dict[str, float]]]:
+    # HTTPException doesn't survive pickling back from a worker process, so
+    # rejections travel as plain data and are re-raised in the server process.
+    # Profiling spans measured in the worker ride along the same way.
+    with collect_spans(PROFILE_ENABLED) as spans:
+        try:
+            return "ok", fn(*args), spans
+        except HTTPException as e:
+            return "error", {"status_code": e.status_code, "detail": e.detail}, spans
+
+
+def _ingest_upload(body: bytes, content_encoding: Optional[str], out_name: str, creator_avatar_id: str) -> Tuple[Dict[str, Any], str]:
+    # Everything CPU- or disk-heavy about an upload; runs in an upload worker process,
+    # so it must only touch the filesystem, not this process's in-memory state.
+    raw = _decode_upload_bytes(body, content_encoding)
+    html = _validate_game_html_bytes(raw)
+
+    # Force creator attribution into metadata if missing.
+    if "creatoravatarid" not in html.lower():
+        inject = f'<meta name="creatorAvatarId" content="{creator_avatar_id}">\n'
+        html = re.sub(r"(?i)</head>", inject + "</head>", html, count=1) or (inject + html)
+
+    out_path = GAMES_DIR / out_name
+    write_text_atomic(out_path, html)
+    _served_game_path(out_path)
+
+    st = out_path.stat()
+    game = _get_game_metadata(out_name, html, _now_iso())
+    game["creatorAvatarId"] = creator_avatar_id
+    game["rev"] = f"{st.st_mtime_ns:x}-{st.st_size:x}"
+    return game, hashlib.sha256(raw).hexdigest()
+
+
+@contextlib.asynccontextmanager
+async def _lifespan(_app: FastAPI) -> AsyncIterator[None]:
+    reconcile = asyncio.ensure_future(run_in_threadpool(_reconcile_catalog))
+    yield
+    reconcile.cancel()
+    if _upload_executor is not None:
+        _upload_executor.shutdown(wait=False, cancel_futures=True)
+
+
+def _sync_room_index(room: str, sess: Dict[str, Any]) -> Dict[str, Any]:
+    # Applies history entries added since the last sync and remembers the session
+    # revision it reflects; returns the room's per-game stats.
+    _touch_room(room)
+    by_game = _game_stats(sess)["byGameId"]
+    GAME_INDEX.sync_history(room, sess.get("history") or [])
+    _room_game_stats[room] = (sess.get("updatedAt") or "", by_game)
+    return by_game
+
+
+def _sync_game_index(room: str) -> Dict[str, Any]:
+    # The catalog half is kept current by _list_games and uploads; only a process
+    # that has never listed the catalog does it here. The room's half costs one
+    # revision lookup; the session is only loaded when another request or process
+    # changed it since the last sync. Returns the room's per-game stats.
+    if not GAME_INDEX.catalog_synced:
+        games, _stale = _current_games()
+        GAME_INDEX.sync_catalog(games, _catalog_revision(games))
+    revision = STORE.session_revision(room)
+    if _room_key(room, revision is not None) is None:
+        return {}
+    synced = _room_game_stats.get(room)
+    if synced is not None and synced[0] == revision:
+        return synced[1]
+    return _sync_room_index(room, STORE.load_session(room))
+
+
 _ensure_dirs()
-app = FastAPI()
+STORE = _make_store()
+GAME_INDEX = GameIndex()
+app = FastAPI(lifespan=_lifespan)
+app.add_middleware(_AdmissionMiddleware)
+PROFILER: Optional[Profiler] = None
+if PROFILE_ENABLED:
+    PROFILER = Profiler(PROFILE_SAMPLE, PROFILE_KEEP, PROFILE_INTERVAL_MS, root=str(ROOT / "backend"))
+    app.add_middleware(PROFILER.middleware)
+    # Lets the sampler attribute threadpool stacks to the request running them.
+    app.router.route_class = ThreadTaggingRoute
 
 @app.exception_handler(HTTPException)
 def http_exception_handler(_request, exc: HTTPException):
     # Return the API's `{ ok:false, error:{...} }` envelope directly (not FastAPI's
     # default `{ detail: ... }`) when our handlers raise `_err(...)`.
     if isinstance(exc.detail, dict) and exc.detail.get("ok") is False:
-        return JSONResponse(status_code=exc.status_code, content=exc.detail)
+        return JSONResponse(status_code=exc.status_code, content=exc.detail, headers=exc.headers)
     return JSONResponse(
         status_code=exc.status_code,
         content={"ok": False, "error": {"code": "http_error", "message": str(exc.detail)}},
+        headers=exc.headers,
     )
 
 
 @app.get("/api/games")
-def api_games() -> Dict[str, Any]:
-    return _ok({"games": _list_games()})
+def api_games(
+    q: str = "",
+    creator: str = "",
+    unplayed: bool = False,
+    sort: str = "recent",
+    limit: Optional[int] = None,
+    room: str = DEFAULT_ROOM,
+) -> Response:
+    if sort not in ("recent", "rating"):
+        raise _err("bad_query", "sort must be recent or rating")
+    room = _sanitize_room(room)
+    if not (q or creator or unplayed or sort != "recent" or limit is not None):
+        games, stale = _current_games()
+        revision = _catalog_revision(games)
+        session_rev = STORE.session_revision(room)
+        # The plain listing depends on the catalog and (for stats) this room's session,
+        # which is only loaded when the cached body is out of date.
+        return _cached_ok(
+            f"games:{_room_key(room, session_rev is not None) or ''}",
+            (revision, stale, session_rev),
+            lambda: {
+                "games": _with_stats(games, _game_stats(STORE.load_session(room))["byGameId"]),
+                "revision": revision,
+                "stale": stale,
+            },
+        )
+
+    by_game = _sync_game_index(room)
+    games, total = GAME_INDEX.search(room, q=q.strip(), creator=creator.strip(), unplayed=unplayed, sort=sort, limit=limit)
+    # `revision` always describes the whole catalog, not the filtered page.
+    revision = GAME_INDEX.revision or _catalog_revision(GAME_INDEX.catalog())
+    stale = not _catalog_reconciled.is_set()
+    return _json_response(_ok({"games": _with_stats(games, by_game), "total": total, "revision": revision, "stale": stale}))
+
+
+@app.get("/api/games/pick")
+def api_games_pick(q: str = "", creator: str = "", exclude: str = "", room: str = DEFAULT_ROOM) -> Dict[str, Any]:
+    room = _sanitize_room(room)
+    _sync_game_index(room)
+    game = GAME_INDEX.pick(room, q=q.strip(), creator=creator.strip(), exclude=exclude.strip())
+    if game is None:
+        raise _err("no_games", "no game matches", status_code=404)
+    return _ok({"game": game})
+
+
+@app.get("/api/games/hash/{sha256}")
+def api_games_hash(
+    sha256: str,
+    filename: Optional[str] = None,
+    creator_avatar_id: Optional[str] = None,
+    x_maribro_token: Optional[str] = Header(None),
+) -> Dict[str, Any]:
+    _check_token(x_maribro_token)
+    sha256 = sha256.strip().lower()
+    if not re.fullmatch(r"[0-9a-f]{64}", sha256):
+        raise _err("bad_hash", "sha256 must be 64 hex characters")
+
+    entries = _lookup_upload_hash(sha256)
+    if filename:
+        out_name = _sanitize_filename(filename)
+        entries = [e for e in entries if e.get("filename") == out_name]
+    if creator_avatar_id:
+        entries = [e for e in entries if e.get("creatorAvatarId") == creator_avatar_id]
+    return _ok({"exists": bool(entries), "matches": entries})
 
 
 @app.post("/api/games")
@@ -269,55 +1033,122 @@ async def api_games_upload(
     creator_avatar_id: str = Form(...),
     filename: Optional[str] = Form(None),
     upload_token: Optional[str] = Form(None),
+    content_encoding: Optional[str] = Form(None),
     x_maribro_token: Optional[str] = Header(None),
 ) -> Dict[str, Any]:
     provided_token = (x_maribro_token or upload_token or "").strip()
-    if provided_token != _expected_upload_token():
-        raise _err("invalid_upload_token", "missing or invalid upload token", status_code=401)
-
-    if not _is_known_avatar(creator_avatar_id):
+    _check_token(provided_token)
+    if not (x_maribro_token or "").strip():
+        # Header tokens were already charged by the admission middleware.
+        wait = _token_limiter.check(provided_token)
+        if wait:
+            raise _rate_limited("token", wait)
+
+    # Reads (and on a cache miss parses) avatars.json: keep it off the event loop.
+    if not await run_in_threadpool(_is_known_avatar, creator_avatar_id):
         raise _err("unknown_avatar", f"unknown creator_avatar_id: {creator_avatar_id}")
 
-    raw = await file.read()
-    html = _validate_game_html_bytes(raw)
-
     out_name = filename or (file.filename or "untitled.html")
+    if content_encoding and not filename:
+        # Compressed parts arrive as e.g. `my-game.html.gz`.
+        out_name = re.sub(r"\.(?:gz|zst)$", "", out_name)
     out_name = _sanitize_filename(out_name)
 
-    # Force creator attribution into metadata if missing.
-    if "creatoravatarid" not in html.lower():
-        inject = f'<meta name="creatorAvatarId" content="{creator_avatar_id}">\n'
-        html = re.sub(r"(?i)</head>", inject + "</head>", html, count=1) or (inject + html)
+    body = await file.read()
+    game, sha256 = await _run_upload_job(_ingest_upload, body, content_encoding, out_name, creator_avatar_id)
+    await run_in_threadpool(_record_upload_hash, sha256, out_name, creator_avatar_id)
+    GAME_INDEX.upsert(game)
+    return _ok({"game": game})
 
-    out_path = GAMES_DIR / out_name
-    out_path.write_text(html, encoding="utf-8")
 
-    game = _get_game_metadata(out_name, html, _now_iso())
-    game["creatorAvatarId"] = creator_avatar_id
-    return _ok({"game": game})
+@app.get("/api/admin/metrics")
+def api_admin_metrics(x_maribro_token: Optional[str] = Header(None)) -> Dict[str, Any]:
+    _check_token(x_maribro_token)
+    return _ok(
+        {
+            "uploads": {
+                **_upload_counters,
+                "running": _upload_running,
+                "queued": _upload_waiting,
+                "avgJobSec": round(_upload_job_sec, 3),
+                "sessionInFlight": _session_in_flight,
+            },
+            "limits": {
+                "workers": UPLOAD_WORKERS,
+                "queueDepth": UPLOAD_QUEUE_DEPTH,
+                "ratePerClientPerMin": UPLOAD_RATE_PER_CLIENT,
+                "burstPerClient": UPLOAD_BURST_PER_CLIENT,
+                "ratePerTokenPerMin": UPLOAD_RATE_PER_TOKEN,
+                "burstPerToken": UPLOAD_BURST_PER_TOKEN,
+                "yieldSec": UPLOAD_YIELD_SEC,
+                "workerNice": UPLOAD_WORKER_NICE,
+                "trackedClients": len(_client_limiter),
+                "trackedTokens": len(_token_limiter),
+            },
+        }
+    )
+
+
+@app.get("/api/admin/profile")
+def api_admin_profile(format: str = "json", reset: bool = False, x_maribro_token: Optional[str] = Header(None)) -> Any:
+    _check_token(x_maribro_token)
+    if PROFILER is None:
+        raise _err("profiling_disabled", "start the host with MARIBRO_PROFILE=1 to enable profiling", status_code=404)
+    if format not in ("json", "collapsed"):
+        raise _err("bad_query", "format must be json or collapsed")
+    if format == "collapsed":
+        text = PROFILER.collapsed()
+        out: Any = PlainTextResponse(
+            text, headers={"Content-Disposition": 'attachment; filename="maribro-profile.collapsed.txt"'}
+        )
+    else:
+        out = _ok(
+            {
+                "sampleRate": PROFILER.sample_rate,
+                "seen": PROFILER.seen,
+                "profiled": PROFILER.profiled,
+                "requests": [r.as_dict() for r in PROFILER.slowest()],
+            }
+        )
+    if reset:
+        PROFILER.reset()
+    return out
+
 
+# Session routes are mounted twice: `/api/session/*` for the default room and
+# `/api/rooms/{room}/session/*` for additional party screens.
+session_router = APIRouter(route_class=ThreadTaggingRoute if PROFILE_ENABLED else APIRoute)
 
-@app.get("/api/session")
-def api_session_get() -> Dict[str, Any]:
-    return _ok({"session": _load_session()})
+
+@session_router.get("/session")
+def api_session_get(room: str = Depends(_room_from_path)) -> Response:
+    revision = STORE.session_revision(room)
+    return _cached_ok(
+        f"session:{_room_key(room, revision is not None) or ''}",
+        revision or STORE.blank_session.get("updatedAt"),
+        lambda: {"session": STORE.load_session(room)},
+    )
 
 
-@app.post("/api/session/reset")
-def api_session_reset() -> Dict[str, Any]:
-    sess = _default_session()
-    _save_session(sess)
+@session_router.post("/session/reset")
+def api_session_reset(room: str = Depends(_room_from_path)) -> Dict[str, Any]:
+    with STORE.session_transaction(room) as sess:
+        recorded = [str(e.get("id")) for e in sess.get("history") or [] if e.get("recording")]
+        sess.clear()
+        sess.update(_default_session())
+    for entry_id in recorded:
+        _recording_path(room, entry_id).unlink(missing_ok=True)
     return _ok({})
 
 
-@app.post("/api/session/players")
-def api_session_players(body: Dict[str, Any]) -> Dict[str, Any]:
+@session_router.post("/session/players")
+def api_session_players(body: Dict[str, Any], room: str = Depends(_room_from_path)) -> Response:
     players = body.get("playersBySlot")
     if not isinstance(players, list):
         raise _err("bad_body", "playersBySlot must be a list")
     if len(players) != 4:
         raise _err("bad_body", "playersBySlot must have exactly 4 entries")
 
-    sess = _load_session()
     next_players = []
     for entry in players:
         try:
@@ -339,21 +1170,29 @@ def api_session_players(body: Dict[str, Any]) -> Dict[str, Any]:
             }
         )
     next_players.sort(key=lambda p: p["slot"])
-    sess["playersBySlot"] = next_players
-    _save_session(sess)
-    return _ok({"session": sess})
+    with STORE.session_transaction(room) as sess:
+        sess["playersBySlot"] = next_players
+    return _json_response(_ok({"session": sess}))
 
 
-@app.post("/api/session/record_game")
-def api_session_record_game(body: Dict[str, Any]) -> Dict[str, Any]:
+def _prepare_round(body: Any) -> Dict[str, Any]:
+    # Validates one round and compresses its input recording; everything that
+    # doesn't need the session happens here, outside the session transaction.
+    if not isinstance(body, dict):
+        raise _err("bad_body", "round must be an object")
     game_id = body.get("gameId")
     scores = body.get("scoresBySlot")
     ratings = body.get("ratingsBySlot")
+    round_id = body.get("roundId")
 
     if not isinstance(game_id, str) or not game_id:
         raise _err("bad_body", "gameId is required")
     if not (isinstance(scores, list) and len(scores) == 4):
         raise _err("bad_body", "scoresBySlot must be length-4 array")
+    if round_id is None:
+        round_id = secrets.token_hex(8)
+    elif not (isinstance(round_id, str) and ROUND_ID_RE.fullmatch(round_id)):
+        raise _err("bad_body", "roundId must be 8-64 characters of [A-Za-z0-9_-]")
 
     scores_clamped = [_clamp_score(s) for s in scores]
     ratings_norm: Optional[List[int]] = None
@@ -370,30 +1209,70 @@ def api_session_record_game(body: Dict[str, Any]) -> Dict[str, Any]:
                 ri = 0
             ratings_norm.append(ri)
 
-    games = {g["id"]: g for g in _list_games()}
-    game = games.get(game_id)
+    games, stale = _current_games()
+    game = next((g for g in games if g["id"] == game_id), None)
+    if not game and stale:
+        game = next((g for g in _list_games() if g["id"] == game_id), None)
     if not game:
         raise _err("unknown_game", f"unknown gameId: {game_id}")
 
-    sess = _load_session()
+    # The recording is optional: a bad one is dropped with a warning and the
+    # round's scores still count.
+    recording_meta: Optional[Dict[str, int]] = None
+    recording_data: Optional[bytes] = None
+    warning: Optional[Dict[str, str]] = None
+    if body.get("inputRecording") is not None:
+        try:
+            raw, frames = _decode_input_recording(body["inputRecording"])
+        except HTTPException as exc:
+            warning = exc.detail["error"]
+        else:
+            recording_data = zlib.compress(raw, 9)
+            recording_meta = {"bytes": len(raw), "frames": frames}
+
+    return {
+        "roundId": round_id,
+        "gameId": game_id,
+        "creatorAvatarId": str(game.get("creatorAvatarId") or ""),
+        "scoresBySlot": scores_clamped,
+        "ratingsBySlot": ratings_norm,
+        "recording": recording_meta,
+        "recordingData": recording_data,
+        "warning": warning,
+    }
+
+
+def _apply_round(sess: Dict[str, Any], rnd: Dict[str, Any], touched: Set[str]) -> Tuple[Dict[str, Any], bool]:
+    # Returns (history entry, duplicate). A round id already in the history is not
+    # applied again, so clients can retry a round until they see a response.
+    history = sess.setdefault("history", [])
+    existing = next((e for e in reversed(history) if e.get("id") == rnd["roundId"]), None)
+    if existing is not None:
+        touched.update(a for a in existing.get("avatarIdsBySlot") or [] if a)
+        if existing.get("creatorAvatarId"):
+            touched.add(existing["creatorAvatarId"])
+        return existing, True
+
     players_by_slot = sess.get("playersBySlot") or []
     slot_to_avatar: Dict[int, str] = {int(p.get("slot")): str(p.get("avatarId") or "") for p in players_by_slot}
 
     scoreboard = sess.get("scoreboardByAvatarId") or {}
-    for slot, pts in enumerate(scores_clamped):
+    for slot, pts in enumerate(rnd["scoresBySlot"]):
         avatar_id = slot_to_avatar.get(slot, "")
         if not avatar_id:
             continue
         entry = scoreboard.get(avatar_id) or {"play": 0, "creator": 0, "total": 0}
         entry["play"] = int(entry.get("play", 0)) + int(pts)
         scoreboard[avatar_id] = entry
+        touched.add(avatar_id)
 
-    creator_avatar_id = str(game.get("creatorAvatarId") or "")
-    creator_bonus = _creator_bonus_from_ratings(ratings_norm)
+    creator_avatar_id = rnd["creatorAvatarId"]
+    creator_bonus = _creator_bonus_from_ratings(rnd["ratingsBySlot"])
     if creator_avatar_id:
         entry = scoreboard.get(creator_avatar_id) or {"play": 0, "creator": 0, "total": 0}
         entry["creator"] = int(entry.get("creator", 0)) + int(creator_bonus)
         scoreboard[creator_avatar_id] = entry
+        touched.add(creator_avatar_id)
 
     # Recompute totals.
     for aid, entry in scoreboard.items():
@@ -403,22 +1282,143 @@ def api_session_record_game(body: Dict[str, Any]) -> Dict[str, Any]:
         scoreboard[aid] = entry
 
     sess["scoreboardByAvatarId"] = scoreboard
-    sess.setdefault("history", []).append(
-        {
-            "playedAt": _now_iso(),
-            "gameId": game_id,
-            "creatorAvatarId": creator_avatar_id,
-            "scoresBySlot": scores_clamped,
-            **({} if ratings_norm is None else {"ratingsBySlot": ratings_norm}),
-        }
+    game_stats = _game_stats(sess)
+    entry = {
+        "id": rnd["roundId"],
+        "playedAt": _now_iso(),
+        "gameId": rnd["gameId"],
+        "creatorAvatarId": creator_avatar_id,
+        "scoresBySlot": rnd["scoresBySlot"],
+        "avatarIdsBySlot": [slot_to_avatar.get(slot, "") for slot in range(4)],
+        **({} if rnd["ratingsBySlot"] is None else {"ratingsBySlot": rnd["ratingsBySlot"]}),
+        **({} if rnd["recording"] is None else {"recording": rnd["recording"]}),
+    }
+    history.append(entry)
+    _apply_game_stats(game_stats["byGameId"], entry)
+    game_stats["applied"] = len(history)
+    sess["gameStats"] = game_stats
+    return entry, False
+
+
+def _scoreboard_delta(sess: Dict[str, Any], touched: Set[str]) -> Dict[str, Any]:
+    # Record responses carry only the scoreboard rows a round touched, not the
+    # whole session; clients merge them into their copy.
+    scoreboard = sess.get("scoreboardByAvatarId") or {}
+    return {
+        "scoreboard": {aid: scoreboard[aid] for aid in sorted(touched) if aid in scoreboard},
+        "historyLength": len(sess.get("history") or []),
+        "updatedAt": sess.get("updatedAt"),
+    }
+
+
+
+
+@session_router.post("/session/record_game")
+def api_session_record_game(body: Dict[str, Any], room: str = Depends(_room_from_path)) -> Response:
+    rnd = _prepare_round(body)
+    touched: Set[str] = set()
+    with STORE.session_transaction(room) as sess:
+        entry, duplicate = _apply_round(sess, rnd, touched)
+    if not duplicate:
+        _save_recording(room, rnd)
+    _sync_room_index(room, sess)
+    warning = {} if rnd["warning"] is None else {"warning": rnd["warning"]}
+    return _json_response(
+        _ok({"roundId": rnd["roundId"], "duplicate": duplicate, "entry": entry, **warning, **_scoreboard_delta(sess, touched)})
     )
-    _save_session(sess)
-    return _ok({"session": sess})
+
+
+@session_router.post("/session/record_games")
+def api_session_record_games(body: Dict[str, Any], room: str = Depends(_room_from_path)) -> Response:
+    # Batch form used by the lobby outbox: all valid rounds are applied in one
+    # transaction, and each round reports its own result so a bad one (e.g. a game
+    # deleted meanwhile) doesn't hold back the rest.
+    rounds = body.get("rounds")
+    if not isinstance(rounds, list) or not rounds:
+        raise _err("bad_body", "rounds must be a non-empty array")
+    if len(rounds) > MAX_BATCH_ROUNDS:
+        raise _err("bad_body", f"at most {MAX_BATCH_ROUNDS} rounds per batch")
+
+    results: List[Dict[str, Any]] = []
+    prepared: List[Tuple[int, Dict[str, Any]]] = []
+    for i, item in enumerate(rounds):
+        round_id = item.get("roundId") if isinstance(item, dict) else None
+        try:
+            rnd = _prepare_round(item)
+            prepared.append((i, rnd))
+            results.append({"roundId": rnd["roundId"], "ok": True})
+            if rnd["warning"] is not None:
+                results[-1]["warning"] = rnd["warning"]
+        except HTTPException as exc:
+            detail = exc.detail if isinstance(exc.detail, dict) else {}
+            results.append({"roundId": round_id, "ok": False, "error": detail.get("error")})
+
+    touched: Set[str] = set()
+    entries: List[Dict[str, Any]] = []
+    new_rounds: List[Dict[str, Any]] = []
+    with STORE.session_transaction(room) as sess:
+        for i, rnd in prepared:
+            entry, duplicate = _apply_round(sess, rnd, touched)
+            results[i]["duplicate"] = duplicate
+            entries.append(entry)
+            if not duplicate:
+                new_rounds.append(rnd)
+    for rnd in new_rounds:
+        _save_recording(room, rnd)
+    _sync_room_index(room, sess)
+    return _json_response(_ok({"results": results, "entries": entries, **_scoreboard_delta(sess, touched)}))
+
+
+@session_router.get("/session/recordings/{entry_id}")
+def api_session_recording(entry_id: str, room: str = Depends(_room_from_path)) -> Dict[str, Any]:
+    history = STORE.load_session(room).get("history") or []
+    entry = next((e for e in reversed(history) if e.get("id") == entry_id), None)
+    path = _recording_path(room, entry_id) if ROUND_ID_RE.fullmatch(entry_id) else None
+    if entry is None or not entry.get("recording") or path is None or not path.is_file():
+        raise _err("not_found", f"no input recording for history entry {entry_id}", status_code=404)
+    raw = zlib.decompress(path.read_bytes())
+    games, _stale = _current_games()
+    game = next((g for g in games if g["id"] == entry.get("gameId")), None)
+    return _ok({"entry": entry, "game": game, "recording": base64.b64encode(raw).decode("ascii")})
+
+
+@app.get("/api/rooms")
+def api_rooms() -> Dict[str, Any]:
+    return _ok({"rooms": [{"room": n, "loaded": loaded} for n, loaded in STORE.rooms()]})
+
+
+app.include_router(session_router, prefix="/api")
+app.include_router(session_router, prefix="/api/rooms/{room}")
 
 
 @app.get("/api/avatars")
-def api_avatars() -> Dict[str, Any]:
-    return _ok({"avatars": _load_avatars_index()})
+def api_avatars() -> Response:
+    avatars = _load_avatars_index()
+    return _cached_ok("avatars", _avatars_cache[0], lambda: {"avatars": avatars})
+
+
+@app.get("/assets/{name}")
+def asset_get(name: str) -> FileResponse:
+    if not ASSET_NAME_RE.fullmatch(name):
+        raise _err("not_found", "unknown asset", status_code=404)
+    path = ASSETS_DIR / name
+    if not path.is_file():
+        raise _err("not_found", "unknown asset", status_code=404)
+    media_type = mimetypes.guess_type(name)[0] or "application/octet-stream"
+    # Content-addressed: a given URL never changes, so browsers can cache it forever.
+    return FileResponse(path, media_type=media_type, headers={"Cache-Control": "public, max-age=31536000, immutable"})
+
+
+@app.get("/games/{filename}")
+def game_get(filename: str) -> FileResponse:
+    if filename.startswith(".") or Path(filename).name != filename:
+        raise _err("not_found", "unknown game file", status_code=404)
+    path = GAMES_DIR / filename
+    if not path.is_file():
+        raise _err("not_found", "unknown game file", status_code=404)
+    if path.suffix != ".html":
+        return FileResponse(path)
+    return FileResponse(_served_game_path(path), media_type="text/html")
 
 
 # Static serving is mounted last so `/api/*` routes win.
@@ -0,0 +1,481 @@
+from __future__ import annotations
+
+import contextlib
+import copy
+import json
+import os
+import sqlite3
+import threading
+import time
+from datetime import datetime, timezone
+from pathlib import Path
+from typing import Any, Callable, Dict, Iterator, List, Optional, Tuple
+
+from .profiling import span
+
+try:
+    import orjson
+except Exception:  # optional: faster JSON; the stdlib encoder is used without it
+    orjson = None
+
+# Storage backends for session state (per room), cached catalog metadata and the
+# upload-hash index (sha256 of an uploaded file -> filenames holding that version).
+#
+# - JsonFileStore: the original layout (data/session.json + data/rooms/<room>.json).
+#   Safe for a single uvicorn worker only.
+# - SqliteStore: one WAL-mode database shared by any number of workers; every
+#   session update runs in a single IMMEDIATE transaction.
+#
+# Both hand out plain dicts shaped exactly like the V1 `SessionState` JSON. Rooms
+# are only created by a write: reading a room that doesn't exist returns the
+# store's shared, never-persisted `blank_session`, so GETs for arbitrary room names
+# leave nothing behind on disk or in memory.
+
+SessionFactory = Callable[[], Dict[str, Any]]
+CatalogEntry = Tuple[str, str, Dict[str, Any]]  # (rev, sha256, GameSummary)
+
+
+def _now_iso() -> str:
+    return datetime.now(timezone.utc).isoformat()
+
+
+def write_bytes_atomic(path: Path, data: bytes) -> None:
+    # Write to a sibling temp file and rename over the target so readers never see
+    # a half-written file, even if the process dies mid-write.
+    path.parent.mkdir(parents=True, exist_ok=True)
+    tmp = path.with_name(f".{path.name}.{os.getpid()}.{threading.get_ident()}.tmp")
+    try:
+        tmp.write_bytes(data)
+        os.replace(tmp, path)
+    except BaseException:
+        tmp.unlink(missing_ok=True)
+        raise
+
+
+def write_text_atomic(path: Path, text: str) -> None:
+    write_bytes_atomic(path, text.encode("utf-8"))
+
+
+def dumps_json(obj: Any, pretty: bool = False) -> bytes:
+    # UTF-8 JSON bytes; compact unless `pretty` (2-space indent, for hand-readable files).
+    if orjson is not None:
+        return orjson.dumps(obj, option=orjson.OPT_NON_STR_KEYS | (orjson.OPT_INDENT_2 if pretty else 0))
+    if pretty:
+        return json.dumps(obj, indent=2, ensure_ascii=False).encode("utf-8")
+    return json.dumps(obj, separators=(",", ":"), ensure_ascii=False).encode("utf-8")
+
+
+def loads_json(data: Any) -> Any:
+    return orjson.loads(data) if orjson is not None else json.loads(data)
+
+
+def write_json_atomic(path: Path, obj: Any, compact: bool = False) -> None:
+    write_bytes_atomic(path, dumps_json(obj) if compact else dumps_json(obj, pretty=True) + b"\n")
+
+
+def read_session_file(path: Path) -> Optional[Dict[str, Any]]:
+    if not path.exists():
+        return None
+    try:
+        data = loads_json(path.read_bytes())
+    except Exception:
+        return None
+    if isinstance(data, dict) and data.get("version") == 1:
+        return data
+    return None
+
+
+class JsonFileStore:
+    # Rooms untouched for `idle_evict_sec` are dropped from memory; every mutation is
+    # already on disk, so eviction only drops the cached copy.
+
+    class _Room:
+        def __init__(self, path: Path) -> None:
+            self.path = path
+            self.lock = threading.Lock()
+            self.session: Optional[Dict[str, Any]] = None
+            self.last_used = time.monotonic()
+
+    def __init__(
+        self,
+        default_path: Path,
+        rooms_dir: Path,
+        default_session: SessionFactory,
+        default_room: str = "default",
+        idle_evict_sec: float = 900.0,
+        catalog_path: Optional[Path] = None,
+        compact_json: bool = False,
+        uploads_path: Optional[Path] = None,
+    ) -> None:
+        self.default_path = default_path
+        self.rooms_dir = rooms_dir
+        self.default_session = default_session
+        self.blank_session = default_session()
+        self.default_room = default_room
+        self.idle_evict_sec = idle_evict_sec
+        self.compact_json = compact_json
+        self._rooms: Dict[str, JsonFileStore._Room] = {}
+        self._rooms_lock = threading.Lock()
+        self.catalog_path = catalog_path
+        self._catalog: Dict[str, CatalogEntry] = self._read_catalog_snapshot()
+        self._catalog_lock = threading.Lock()
+        self.uploads_path = uploads_path
+        self._uploads_lock = threading.Lock()
+
+    def _read_catalog_snapshot(self) -> Dict[str, CatalogEntry]:
+        if self.catalog_path is None or not self.catalog_path.exists():
+            return {}
+        try:
+            data = loads_json(self.catalog_path.read_bytes())
+            return {f: (str(e["rev"]), str(e["sha256"]), dict(e["game"])) for f, e in data["games"].items()}
+        except Exception:
+            return {}
+
+    def _path_for(self, room: str) -> Path:
+        return self.default_path if room == self.default_room else self.rooms_dir / f"{room}.json"
+
+    def _room(self, name: str, create: bool = True) -> Optional["JsonFileStore._Room"]:
+        now = time.monotonic()
+        with self._rooms_lock:
+            room = self._rooms.get(name)
+            if room is None:
+                path = self._path_for(name)
+                if not create and not path.exists():
+                    return None
+                room = self._rooms[name] = JsonFileStore._Room(path)
+            room.last_used = now
+            for other_name, other in list(self._rooms.items()):
+                if now - other.last_used > self.idle_evict_sec and not other.lock.locked():
+                    del self._rooms[other_name]
+        return room
+
+    def _load(self, room: "JsonFileStore._Room") -> Dict[str, Any]:
+        # Callers hold room.lock; the file is only read the first time the room is used.
+        if room.session is None:
+            room.session = read_session_file(room.path) or self.default_session()
+        return room.session
+
+    def load_session(self, room: str) -> Dict[str, Any]:
+        # Cached sessions are never mutated in place (transactions work on a copy and
+        # swap it in), so the returned dict is safe to serialize; treat it as read-only.
+        r = self._room(room, create=False)
+        if r is None:
+            return self.blank_session
+        with r.lock:
+            return self._load(r)
+
+    def session_revision(self, room: str) -> Optional[str]:
+        # `updatedAt` of the room's session, or None if the room doesn't exist yet.
+        r = self._room(room, create=False)
+        if r is None:
+            return None
+        with r.lock:
+            return self._load(r).get("updatedAt")
+
+    @contextlib.contextmanager
+    def session_transaction(self, room: str) -> Iterator[Dict[str, Any]]:
+        r = self._room(room)
+        assert r is not None
+        with r.lock:
+            sess = copy.deepcopy(self._load(r))
+            yield sess
+            sess["updatedAt"] = _now_iso()
+            with span("session_save"):
+                write_json_atomic(r.path, sess, compact=self.compact_json)
+            r.session = sess
+
+    def rooms(self) -> List[Tuple[str, bool]]:
+        with self._rooms_lock:
+            loaded = set(self._rooms)
+        names = {self.default_room} | {p.stem for p in self.rooms_dir.glob("*.json")} | loaded
+        return [(n, n in loaded) for n in sorted(names)]
+
+    def catalog_entries(self) -> Dict[str, CatalogEntry]:
+        with self._catalog_lock:
+            return dict(self._catalog)
+
+    def catalog_update(self, put: Dict[str, CatalogEntry], delete: List[str]) -> None:
+        with self._catalog_lock:
+            self._catalog.update(put)
+            for f in delete:
+                self._catalog.pop(f, None)
+            if self.catalog_path is None:
+                return
+            # Compact on purpose: this is a cache read once at startup, not a hand-edited file.
+            snapshot = {"version": 1, "games": {f: {"rev": e[0], "sha256": e[1], "game": e[2]} for f, e in self._catalog.items()}}
+            write_bytes_atomic(self.catalog_path, dumps_json(snapshot))
+
+    def _read_uploads(self) -> Dict[str, List[Dict[str, str]]]:
+        if self.uploads_path is None:
+            return {}
+        try:
+            data = loads_json(self.uploads_path.read_bytes())
+        except Exception:
+            return {}
+        return data if isinstance(data, dict) else {}
+
+    def upload_matches(self, sha256: str) -> List[Dict[str, str]]:
+        return list(self._read_uploads().get(sha256) or [])
+
+    def upload_record(self, sha256: str, filename: str, creator_avatar_id: str) -> None:
+        with self._uploads_lock:
+            index = self._read_uploads()
+            # A filename holds exactly one version, so drop it from any older hash first.
+            for key in list(index):
+                index[key] = [e for e in index[key] if e.get("filename") != filename]
+                if not index[key]:
+                    del index[key]
+            index.setdefault(sha256, []).append({"filename": filename, "creatorAvatarId": creator_avatar_id})
+            if self.uploads_path is not None:
+                write_json_atomic(self.uploads_path, index, compact=self.compact_json)
+
+
+SQLITE_SCHEMA = """
+CREATE TABLE IF NOT EXISTS sessions (
+    room TEXT PRIMARY KEY,
+    version INTEGER NOT NULL,
+    created_at TEXT NOT NULL,
+    updated_at TEXT NOT NULL,
+    players_json TEXT NOT NULL,
+    scoreboard_json TEXT NOT NULL,
+    game_stats_json TEXT NOT NULL DEFAULT '{}'
+);
+CREATE TABLE IF NOT EXISTS history (
+    id INTEGER PRIMARY KEY AUTOINCREMENT,
+    room TEXT NOT NULL,
+    entry_json TEXT NOT NULL
+);
+CREATE INDEX IF NOT EXISTS history_room ON history (room, id);
+CREATE TABLE IF NOT EXISTS games (
+    filename TEXT PRIMARY KEY,
+    rev TEXT NOT NULL,
+    sha256 TEXT NOT NULL DEFAULT '',
+    meta_json TEXT NOT NULL
+);
+CREATE TABLE IF NOT EXISTS uploads (
+    filename TEXT PRIMARY KEY,
+    sha256 TEXT NOT NULL,
+    creator_avatar_id TEXT NOT NULL
+);
+CREATE INDEX IF NOT EXISTS uploads_sha256 ON uploads (sha256);
+"""
+
+
+class SqliteStore:
+    # Connections are per thread (FastAPI runs sync handlers in a thread pool); WAL
+    # lets readers in other workers proceed while one writer holds the lock.
+
+    def __init__(
+        self,
+        db_path: Path,
+        default_session: SessionFactory,
+        legacy_default_path: Optional[Path] = None,
+        legacy_rooms_dir: Optional[Path] = None,
+        default_room: str = "default",
+        busy_timeout_ms: int = 10_000,
+        legacy_uploads_path: Optional[Path] = None,
+    ) -> None:
+        self.db_path = db_path
+        self.default_session = default_session
+        self.blank_session = default_session()
+        self.legacy_default_path = legacy_default_path
+        self.legacy_rooms_dir = legacy_rooms_dir
+        self.default_room = default_room
+        self.busy_timeout_ms = busy_timeout_ms
+        self._local = threading.local()
+        db_path.parent.mkdir(parents=True, exist_ok=True)
+        conn = self._conn()
+        conn.executescript(SQLITE_SCHEMA)
+        if "sha256" not in {r[1] for r in conn.execute("PRAGMA table_info(games)")}:
+            conn.execute("ALTER TABLE games ADD COLUMN sha256 TEXT NOT NULL DEFAULT ''")
+        if "game_stats_json" not in {r[1] for r in conn.execute("PRAGMA table_info(sessions)")}:
+            conn.execute("ALTER TABLE sessions ADD COLUMN game_stats_json TEXT NOT NULL DEFAULT '{}'")
+        if legacy_uploads_path is not None:
+            self._import_uploads(legacy_uploads_path)
+
+    def _import_uploads(self, path: Path) -> None:
+        # One-time import of data/uploads.json from the JSON backend.
+        try:
+            data = loads_json(path.read_bytes())
+        except Exception:
+            return
+        if not isinstance(data, dict):
+            return
+        with self._tx() as conn:
+            if conn.execute("SELECT 1 FROM uploads LIMIT 1").fetchone() is not None:
+                return
+            conn.executemany(
+                "INSERT OR REPLACE INTO uploads (filename, sha256, creator_avatar_id) VALUES (?, ?, ?)",
+                [
+                    (str(e.get("filename") or ""), str(sha), str(e.get("creatorAvatarId") or ""))
+                    for sha, entries in data.items()
+                    if isinstance(entries, list)
+                    for e in entries
+                    if isinstance(e, dict) and e.get("filename")
+                ],
+            )
+
+    def _conn(self) -> sqlite3.Connection:
+        conn = getattr(self._local, "conn", None)
+        if conn is None:
+            conn = sqlite3.connect(str(self.db_path), isolation_level=None, timeout=self.busy_timeout_ms / 1000)
+            conn.execute("PRAGMA journal_mode=WAL")
+            conn.execute("PRAGMA synchronous=NORMAL")
+            conn.execute(f"PRAGMA busy_timeout={int(self.busy_timeout_ms)}")
+            self._local.conn = conn
+        return conn
+
+    @contextlib.contextmanager
+    def _tx(self) -> Iterator[sqlite3.Connection]:
+        # IMMEDIATE takes the write lock up front, so read-modify-write cycles from
+        # concurrent workers serialize instead of failing with SQLITE_BUSY on upgrade.
+        conn = self._conn()
+        conn.execute("BEGIN IMMEDIATE")
+        try:
+            yield conn
+            with span("sqlite_commit"):
+                conn.execute("COMMIT")
+        except BaseException:
+            # Also covers a failed COMMIT (e.g. SQLITE_BUSY), which leaves the
+            # transaction open on this thread's connection.
+            if conn.in_transaction:
+                conn.execute("ROLLBACK")
+            raise
+
+    def _legacy_path(self, room: str) -> Optional[Path]:
+        if room == self.default_room:
+            return self.legacy_default_path
+        if self.legacy_rooms_dir is None:
+            return None
+        return self.legacy_rooms_dir / f"{room}.json"
+
+    def _read(self, conn: sqlite3.Connection, room: str) -> Optional[Dict[str, Any]]:
+        row = conn.execute(
+            "SELECT version, created_at, updated_at, players_json, scoreboard_json, game_stats_json FROM sessions WHERE room = ?",
+            (room,),
+        ).fetchone()
+        if row is None:
+            return None
+        history = [loads_json(r[0]) for r in conn.execute("SELECT entry_json FROM history WHERE room = ? ORDER BY id", (room,))]
+        sess = {
+            "version": row[0],
+            "createdAt": row[1],
+            "updatedAt": row[2],
+            "playersBySlot": loads_json(row[3]),
+            "scoreboardByAvatarId": loads_json(row[4]),
+            "history": history,
+        }
+        game_stats = loads_json(row[5] or "{}")
+        if game_stats:
+            sess["gameStats"] = game_stats
+        return sess
+
+    def _write(self, conn: sqlite3.Connection, room: str, sess: Dict[str, Any]) -> None:
+        conn.execute(
+            "INSERT INTO sessions (room, version, created_at, updated_at, players_json, scoreboard_json, game_stats_json)"
+            " VALUES (?, ?, ?, ?, ?, ?, ?)"
+            " ON CONFLICT (room) DO UPDATE SET version = excluded.version, created_at = excluded.created_at,"
+            " updated_at = excluded.updated_at, players_json = excluded.players_json,"
+            " scoreboard_json = excluded.scoreboard_json, game_stats_json = excluded.game_stats_json",
+            (
+                room,
+                int(sess.get("version", 1)),
+                str(sess.get("createdAt") or _now_iso()),
+                str(sess.get("updatedAt") or _now_iso()),
+                dumps_json(sess.get("playersBySlot") or []).decode("utf-8"),
+                dumps_json(sess.get("scoreboardByAvatarId") or {}).decode("utf-8"),
+                dumps_json(sess.get("gameStats") or {}).decode("utf-8"),
+            ),
+        )
+
+    def _append_history(self, conn: sqlite3.Connection, room: str, entries: List[Dict[str, Any]]) -> None:
+        conn.executemany(
+            "INSERT INTO history (room, entry_json) VALUES (?, ?)",
+            [(room, dumps_json(e).decode("utf-8")) for e in entries],
+        )
+
+    def _load_or_create(self, conn: sqlite3.Connection, room: str) -> Dict[str, Any]:
+        sess = self._read(conn, room)
+        if sess is not None:
+            return sess
+        # First time this room is seen in the database: import its session.json if any.
+        legacy = self._legacy_path(room)
+        sess = (read_session_file(legacy) if legacy else None) or self.default_session()
+        self._write(conn, room, sess)
+        self._append_history(conn, room, sess.get("history") or [])
+        return sess
+
+    def load_session(self, room: str) -> Dict[str, Any]:
+        conn = self._conn()
+        sess = self._read(conn, room)
+        if sess is not None:
+            return sess
+        legacy = self._legacy_path(room)
+        if legacy is None or read_session_file(legacy) is None:
+            return self.blank_session
+        # An existing session.json is a real room: import it now.
+        with self._tx() as conn:
+            return self._load_or_create(conn, room)
+
+    def session_revision(self, room: str) -> Optional[str]:
+        # One indexed row instead of decoding the whole history: lets response
+        # caches check freshness before loading the session.
+        row = self._conn().execute("SELECT updated_at FROM sessions WHERE room = ?", (room,)).fetchone()
+        if row is not None:
+            return row[0]
+        legacy = self._legacy_path(room)
+        if legacy is None or not legacy.exists():
+            return None
+        sess = self.load_session(room)  # imports the legacy session.json
+        return None if sess is self.blank_session else sess.get("updatedAt")
+
+    @contextlib.contextmanager
+    def session_transaction(self, room: str) -> Iterator[Dict[str, Any]]:
+        with self._tx() as conn:
+            sess = self._load_or_create(conn, room)
+            history = sess.get("history")
+            n_before = len(history or [])
+            yield sess
+            sess["updatedAt"] = _now_iso()
+            with span("session_save"):
+                self._write(conn, room, sess)
+                new_history = sess.get("history") or []
+                if new_history is history and len(new_history) >= n_before:
+                    self._append_history(conn, room, new_history[n_before:])
+                else:
+                    # History was replaced (e.g. session reset): rewrite it.
+                    conn.execute("DELETE FROM history WHERE room = ?", (room,))
+                    self._append_history(conn, room, new_history)
+
+    def rooms(self) -> List[Tuple[str, bool]]:
+        names = {self.default_room} | {r[0] for r in self._conn().execute("SELECT room FROM sessions")}
+        return [(n, True) for n in sorted(names)]
+
+    def catalog_entries(self) -> Dict[str, CatalogEntry]:
+        rows = self._conn().execute("SELECT filename, rev, sha256, meta_json FROM games").fetchall()
+        return {f: (rev, sha, loads_json(meta)) for f, rev, sha, meta in rows}
+
+    def catalog_update(self, put: Dict[str, CatalogEntry], delete: List[str]) -> None:
+        with self._tx() as conn:
+            conn.executemany(
+                "INSERT INTO games (filename, rev, sha256, meta_json) VALUES (?, ?, ?, ?)"
+                " ON CONFLICT (filename) DO UPDATE SET rev = excluded.rev, sha256 = excluded.sha256,"
+                " meta_json = excluded.meta_json",
+                [(f, rev, sha, dumps_json(game).decode("utf-8")) for f, (rev, sha, game) in put.items()],
+            )
+            conn.executemany("DELETE FROM games WHERE filename = ?", [(f,) for f in delete])
+
+    def upload_matches(self, sha256: str) -> List[Dict[str, str]]:
+        rows = self._conn().execute(
+            "SELECT filename, creator_avatar_id FROM uploads WHERE sha256 = ? ORDER BY rowid", (sha256,)
+        ).fetchall()
+        return [{"filename": f, "creatorAvatarId": c} for f, c in rows]
+
+    def upload_record(self, sha256: str, filename: str, creator_avatar_id: str) -> None:
+        # REPLACE drops the filename's previous version (it holds exactly one), so
+        # concurrent uploads in other workers never overwrite each other's rows.
+        with self._tx() as conn:
+            conn.execute(
+                "INSERT OR REPLACE INTO uploads (filename, sha256, creator_avatar_id) VALUES (?, ?, ?)",
+                (filename, sha256, creator_avatar_id),
+            )
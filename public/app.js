@@ -1,5 +1,16 @@
 const $ = (id) => document.getElementById(id);
 
+// Open the lobby as `/?room=<name>` to run an extra party screen off the same host.
+const ROOM = new URLSearchParams(window.location.search).get("room") || "";
+
+function sessionApi(suffix = "") {
+  const base = ROOM ? `/api/rooms/${encodeURIComponent(ROOM)}/session` : "/api/session";
+  return base + suffix;
+}
+
+// Game stats (plays, ratings) in the listing are per room.
+const GAMES_API = ROOM ? `/api/games?room=${encodeURIComponent(ROOM)}` : "/api/games";
+
 const state = {
   avatars: [],
   games: [],
@@ -11,6 +22,8 @@ const state = {
   claimInFlight: false,
   activeRun: null, // { gameId, startedAtMs, maxDurationSec, tickTimer, hardTimeout }
   audioEnabled: false,
+  catalogRevision: null, // last /api/games revision the service worker confirmed as cached
+  catalogSyncing: null, // revision posted to the worker and not yet answered
 };
 
 function setStatus(text) {
@@ -126,7 +139,7 @@ async function updatePlayers(partial) {
   }
   // lockedIn is server-derived; we don't send it.
   const payload = next.map((p) => ({ slot: p.slot, avatarId: p.avatarId || "", gamepadIndex: Number(p.gamepadIndex ?? -1) }));
-  const res = await apiPostJson("/api/session/players", { playersBySlot: payload });
+  const res = await apiPostJson(sessionApi("/players"), { playersBySlot: payload });
   state.session = normalizeSession(res.session);
   render();
 }
@@ -140,11 +153,14 @@ function renderGames() {
     const av = avatarById(g.creatorAvatarId);
     const color = av?.color || "rgba(255,255,255,0.25)";
     const creator = g.creatorAvatarId ? `by ${g.creatorAvatarId}` : "by (unknown)";
+    const st = g.stats || {};
+    const played = st.plays ? `${st.plays}× · 👍${st.thumbsUp || 0} 👎${st.thumbsDown || 0}` : "new";
     el.innerHTML = `
       <div class="title">${escapeHtml(g.title || g.id)}</div>
       <div class="desc">${escapeHtml(g.description || "")}</div>
       <div class="row" style="margin-top:10px;justify-content:space-between;">
         <div class="chip"><span class="dot" style="background:${color}"></span>${escapeHtml(creator)}</div>
+        <div class="chip">${escapeHtml(played)}</div>
         <div class="chip">${g.maxDurationSec}s</div>
       </div>
     `;
@@ -263,10 +279,107 @@ function stopActiveRun(reason) {
   setStatus("Back to lobby.");
 }
 
-async function recordGame(gameId, scoresBySlot) {
-  const res = await apiPostJson("/api/session/record_game", { gameId, scoresBySlot });
-  state.session = normalizeSession(res.session);
-  render();
+// Finished rounds go through an outbox in localStorage and are flushed in the
+// background, so the lobby comes back immediately and a slow or restarting host
+// loses nothing. Each round carries a client-generated id, which makes retries
+// (and a second tab flushing the same outbox) idempotent on the host.
+const OUTBOX_KEY = `maribro:outbox:${ROOM || "default"}`;
+const OUTBOX_BATCH = 50; // host-side MAX_BATCH_ROUNDS
+const outbox = { flushing: false, retryTimer: null, retryMs: 1000, memory: [], volatile: false };
+
+function newRoundId() {
+  const bytes = new Uint8Array(12);
+  crypto.getRandomValues(bytes);
+  return Array.from(bytes, (b) => b.toString(16).padStart(2, "0")).join("");
+}
+
+function loadOutbox() {
+  if (outbox.volatile) return outbox.memory;
+  try {
+    const rounds = JSON.parse(localStorage.getItem(OUTBOX_KEY) || "[]");
+    return Array.isArray(rounds) ? rounds : [];
+  } catch {
+    return outbox.memory;
+  }
+}
+
+function saveOutbox(rounds) {
+  outbox.memory = rounds;
+  try {
+    if (rounds.length) localStorage.setItem(OUTBOX_KEY, JSON.stringify(rounds));
+    else localStorage.removeItem(OUTBOX_KEY);
+    outbox.volatile = false;
+    return;
+  } catch (e) {
+    console.warn("outbox: storage full, keeping rounds without input recordings", e);
+  }
+  try {
+    // Recordings are a debugging aid; the scores are what must survive.
+    localStorage.setItem(OUTBOX_KEY, JSON.stringify(rounds.map(({ inputRecording, ...r }) => r)));
+    outbox.volatile = false;
+  } catch {
+    outbox.volatile = true;
+  }
+}
+
+function scheduleOutboxRetry() {
+  clearTimeout(outbox.retryTimer);
+  outbox.retryTimer = setTimeout(() => flushOutbox().catch((e) => console.warn(e)), outbox.retryMs);
+  outbox.retryMs = Math.min(outbox.retryMs * 2, 30000);
+}
+
+async function flushOutbox() {
+  if (outbox.flushing) return;
+  outbox.flushing = true;
+  clearTimeout(outbox.retryTimer);
+  try {
+    for (;;) {
+      const pending = loadOutbox().slice(0, OUTBOX_BATCH);
+      if (!pending.length) break;
+      let data;
+      try {
+        data = await apiPostJson(sessionApi("/record_games"), { rounds: pending });
+      } catch (e) {
+        setStatus(`Scores not saved yet (${loadOutbox().length} pending): ${e.message}. Retrying…`);
+        scheduleOutboxRetry();
+        return;
+      }
+      for (const r of data.results || []) {
+        if (!r.ok) console.warn(`outbox: host rejected round ${r.roundId}`, r.error);
+        else if (r.warning) console.warn(`outbox: round ${r.roundId} saved without its recording`, r.warning);
+      }
+      // Every answered round is done: applied, already applied, or permanently rejected.
+      const answered = new Set(pending.map((r) => r.roundId));
+      saveOutbox(loadOutbox().filter((r) => !answered.has(r.roundId)));
+      if (outbox.retryMs > 1000) setStatus("Pending scores saved.");
+      outbox.retryMs = 1000;
+      await applyRecordDelta(data);
+    }
+  } finally {
+    outbox.flushing = false;
+  }
+}
+
+async function applyRecordDelta(data) {
+  const sess = state.session;
+  if (!sess) return;
+  sess.scoreboardByAvatarId = { ...(sess.scoreboardByAvatarId || {}), ...(data.scoreboard || {}) };
+  sess.history = sess.history || [];
+  const known = new Set(sess.history.map((e) => e.id));
+  for (const e of data.entries || []) if (!known.has(e.id)) sess.history.push(e);
+  sess.updatedAt = data.updatedAt || sess.updatedAt;
+  if (sess.history.length !== data.historyLength) {
+    // Someone else changed this room (another tab, a reset); take the host's copy.
+    state.session = normalizeSession((await apiJson(sessionApi())).session);
+  }
+  renderScores();
+}
+
+function recordGame(gameId, scoresBySlot, inputRecording) {
+  const round = { roundId: newRoundId(), gameId, scoresBySlot };
+  if (inputRecording) round.inputRecording = inputRecording;
+  saveOutbox([...loadOutbox(), round]);
+  flushOutbox().catch((e) => console.warn(e));
 }
 
 function startGame(game) {
@@ -315,7 +428,7 @@ function startGame(game) {
   state.activeRun.hardTimeout = setTimeout(() => {
     // Timeout = force end + record all zeros.
     stopActiveRun("timeout");
-    recordGame(game.id, [0, 0, 0, 0]).catch((e) => console.warn(e));
+    recordGame(game.id, [0, 0, 0, 0]);
   }, maxDurationSec * 1000 + 250);
 
   // Send init once iframe is likely alive; retry a couple times.
@@ -326,6 +439,7 @@ function startGame(game) {
     activeSlots,
     maxDurationSec,
     startedAtMs,
+    record: true, // SDK posts a compact input recording with game_end (replayable via verify.py --replay)
   };
   let tries = 0;
   const initTimer = setInterval(() => {
@@ -353,7 +467,8 @@ function hookGameMessages() {
       const scores = msg.payload?.scoresBySlot;
       if (!Array.isArray(scores) || scores.length !== 4) return;
       stopActiveRun("host");
-      recordGame(run.gameId, scores).catch((e) => alert(`Failed to record: ${e.message}`));
+      const recording = typeof msg.payload?.inputRecording === "string" ? msg.payload.inputRecording : null;
+      recordGame(run.gameId, scores, recording);
     }
   });
 }
@@ -392,15 +507,53 @@ function pollGamepadsForPresses() {
   }
 }
 
+function registerServiceWorker() {
+  if (!("serviceWorker" in navigator)) return;
+  navigator.serviceWorker.register("/sw.js").catch((e) => console.warn("service worker registration failed", e));
+}
+
+function syncCatalogToServiceWorker(data) {
+  // Post when the catalog changed, and keep re-posting on later polls until the worker
+  // confirms it cached that revision (a sync fails while the host is unreachable).
+  if (!("serviceWorker" in navigator) || !data?.revision) return;
+  if (data.revision === state.catalogRevision || data.revision === state.catalogSyncing) return;
+  const revision = data.revision;
+  const games = (data.games || []).map((g) => ({ filename: g.filename, rev: g.rev || "" }));
+  state.catalogSyncing = revision;
+  navigator.serviceWorker.ready
+    .then(
+      (reg) =>
+        new Promise((resolve) => {
+          if (!reg.active) return resolve(false);
+          const channel = new MessageChannel();
+          // A worker killed mid-sync never answers; give up so the next poll re-posts.
+          const timer = setTimeout(() => resolve(false), 60000);
+          channel.port1.onmessage = (ev) => {
+            clearTimeout(timer);
+            resolve(ev.data?.ok === true);
+          };
+          reg.active.postMessage({ type: "maribro:catalog", payload: { revision, games } }, [channel.port2]);
+        })
+    )
+    .then((ok) => {
+      if (ok) state.catalogRevision = revision;
+    })
+    .catch(() => {})
+    .finally(() => {
+      if (state.catalogSyncing === revision) state.catalogSyncing = null;
+    });
+}
+
 async function refresh() {
   const [avatars, games, session] = await Promise.all([
     apiJson("/api/avatars"),
-    apiJson("/api/games"),
-    apiJson("/api/session"),
+    apiJson(GAMES_API),
+    apiJson(sessionApi()),
   ]);
   state.avatars = avatars.avatars || [];
   state.games = games.games || [];
   state.session = normalizeSession(session.session);
+  syncCatalogToServiceWorker(games);
   render();
 }
 
@@ -414,7 +567,8 @@ function hookButtons() {
   });
   $("resetSessionBtn").addEventListener("click", async () => {
     if (!confirm("Reset session scores + history?")) return;
-    await apiJson("/api/session/reset", { method: "POST" });
+    saveOutbox([]); // unsent rounds belong to the session being reset
+    await apiJson(sessionApi("/reset"), { method: "POST" });
     await refresh();
   });
   $("startGameBtn").addEventListener("click", () => {
@@ -422,9 +576,19 @@ function hookButtons() {
     if (!g) return;
     startGame(g);
   });
-  $("randomGameBtn").addEventListener("click", () => {
+  $("randomGameBtn").addEventListener("click", async () => {
     if (!state.games.length) return;
-    const g = state.games[Math.floor(Math.random() * state.games.length)];
+    // Server pick prefers games this room hasn't played yet; fall back to a local draw.
+    let g = null;
+    try {
+      const params = new URLSearchParams({ exclude: state.selectedGameId || "" });
+      if (ROOM) params.set("room", ROOM);
+      const data = await apiJson(`/api/games/pick?${params}`);
+      g = state.games.find((x) => x.id === data.game?.id) || null;
+    } catch (e) {
+      console.warn(e);
+    }
+    if (!g) g = state.games[Math.floor(Math.random() * state.games.length)];
     state.selectedGameId = g.id;
     renderGames();
   });
@@ -432,7 +596,7 @@ function hookButtons() {
     const run = state.activeRun;
     if (!run) return;
     stopActiveRun("host");
-    recordGame(run.gameId, [0, 0, 0, 0]).catch((e) => console.warn(e));
+    recordGame(run.gameId, [0, 0, 0, 0]);
   });
 }
 
@@ -440,14 +604,19 @@ async function main() {
   setStatus("Loading…");
   hookButtons();
   hookGameMessages();
+  registerServiceWorker();
   await refresh();
   updateAudioButton();
+  // Rounds left over from before a reload or a host restart.
+  flushOutbox().catch((e) => console.warn(e));
+  window.addEventListener("online", () => flushOutbox().catch((e) => console.warn(e)));
 
   // Poll for new games.
   setInterval(() => {
-    apiJson("/api/games")
+    apiJson(GAMES_API)
       .then((data) => {
         state.games = data.games || [];
+        syncCatalogToServiceWorker(data);
         renderGames();
       })
       .catch(() => {});
@@ -456,7 +625,7 @@ async function main() {
   // Lightweight gamepad detection loop.
   setInterval(pollGamepadsForPresses, 80);
 
-  setStatus("Ready.");
+  setStatus(ROOM ? `Ready (room: ${ROOM}).` : "Ready.");
 }
 
 main().catch((e) => {
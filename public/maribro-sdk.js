@@ -10,6 +10,8 @@
     audioConfig: { enabled: true, masterVolume: 0.25 },
     audio: { custom: false, armed: false },
     fallbackBloop: { lastButtonsBySlot: new Map(), lastBloopAtBySlot: new Map() },
+    recorder: null, // input recorder while the host asked for a recording
+    replay: null, // decoded recording while replaying (verify.py --replay)
   };
 
   const readyHandlers = [];
@@ -154,10 +156,7 @@
     return out;
   }
 
-  function getInput(slot) {
-    const s = Number(slot);
-    if (!(s >= 0 && s <= 3)) return makeEmptyInput();
-
+  function readInput(s) {
     if (state.mock) return mockInputForSlot(s);
 
     const gpIndex = state.ctx?.slotToGamepadIndex?.[s];
@@ -165,6 +164,228 @@
     return normalizeGamepad(pads?.[gpIndex]);
   }
 
+  function getInput(slot) {
+    const s = Number(slot);
+    if (!(s >= 0 && s <= 3)) return makeEmptyInput();
+    if (state.replay) return replayInputForSlot(s);
+    return readInput(s);
+  }
+
+  // --- Input recording / replay ---
+  //
+  // One frame per requestAnimationFrame, each active slot packed into 8 bytes:
+  //   [0..1] button bits (REC_BUTTONS order, little endian)
+  //   [2..3] l2, r2 as 0..31
+  //   [4..7] lx, ly, rx, ry as int8 in -31..31
+  // Stream: "MR", version, slot mask, uint32 frame count, then per frame an op byte:
+  //   0x00 + varint n   -> n frames identical to the previous one
+  //   bits 0-3          -> these slots changed; each is followed by a byte mask of
+  //                        changed fields and then just those bytes
+  //   bit 4             -> followed by the frame's dt in ms (only stored when it
+  //                        drifts more than 2ms from the last stored dt)
+  const REC_BUTTONS = ["south", "east", "west", "north", "l1", "r1", "select", "start", "l3", "r3", "dup", "ddown", "dleft", "dright"];
+  const REC_AXES = ["lx", "ly", "rx", "ry"];
+  const REC_MAX_BYTES = 256 * 1024;
+
+  function packInput(input, out, off) {
+    const b = input?.buttons || {};
+    const a = input?.axes || {};
+    let bits = 0;
+    REC_BUTTONS.forEach((k, i) => {
+      if (b[k]) bits |= 1 << i;
+    });
+    out[off] = bits & 0xff;
+    out[off + 1] = bits >> 8;
+    out[off + 2] = Math.round(Math.max(0, Math.min(1, Number(b.l2) || 0)) * 31);
+    out[off + 3] = Math.round(Math.max(0, Math.min(1, Number(b.r2) || 0)) * 31);
+    REC_AXES.forEach((k, i) => {
+      const v = clampAxis(a[k]);
+      out[off + 4 + i] = Math.round((Math.abs(v) < 0.08 ? 0 : v) * 31) & 0xff;
+    });
+  }
+
+  function unpackInput(buf, off) {
+    const out = makeEmptyInput();
+    const bits = buf[off] | (buf[off + 1] << 8);
+    REC_BUTTONS.forEach((k, i) => {
+      out.buttons[k] = !!(bits & (1 << i));
+    });
+    out.buttons.l2 = buf[off + 2] / 31;
+    out.buttons.r2 = buf[off + 3] / 31;
+    REC_AXES.forEach((k, i) => {
+      const v = buf[off + 4 + i];
+      out.axes[k] = (v > 127 ? v - 256 : v) / 31;
+    });
+    return out;
+  }
+
+  function startRecorder(slots) {
+    const rec = {
+      slots: slots.filter((s) => s >= 0 && s <= 3),
+      bytes: new Uint8Array(4096),
+      len: 8,
+      frames: 0,
+      idleRun: 0,
+      lastDt: 16,
+      lastAt: null,
+      prev: new Uint8Array(32),
+      cur: new Uint8Array(32),
+      full: false,
+    };
+    state.recorder = rec;
+
+    const put = (v) => {
+      if (rec.len >= rec.bytes.length) {
+        if (rec.bytes.length >= REC_MAX_BYTES) {
+          rec.full = true;
+          return;
+        }
+        const bigger = new Uint8Array(rec.bytes.length * 2);
+        bigger.set(rec.bytes);
+        rec.bytes = bigger;
+      }
+      rec.bytes[rec.len++] = v;
+    };
+    const putVarint = (n) => {
+      while (n >= 0x80) {
+        put((n & 0x7f) | 0x80);
+        n >>>= 7;
+      }
+      put(n);
+    };
+    rec.flushIdle = () => {
+      if (!rec.idleRun) return;
+      put(0);
+      putVarint(rec.idleRun);
+      rec.idleRun = 0;
+    };
+
+    const step = (now) => {
+      if (state.recorder !== rec || rec.full) return;
+      const dt = rec.lastAt == null ? 16 : Math.min(255, Math.round(now - rec.lastAt));
+      rec.lastAt = now;
+      for (const s of rec.slots) packInput(readInput(s), rec.cur, s * 8);
+
+      let op = 0;
+      const fieldMasks = [0, 0, 0, 0];
+      for (const s of rec.slots) {
+        for (let i = 0; i < 8; i++) {
+          if (rec.cur[s * 8 + i] !== rec.prev[s * 8 + i] || rec.frames === 0) fieldMasks[s] |= 1 << i;
+        }
+        if (fieldMasks[s]) op |= 1 << s;
+      }
+      const dtChanged = Math.abs(dt - rec.lastDt) > 2;
+      if (dtChanged) op |= 0x10;
+
+      if (!op) {
+        rec.idleRun++;
+      } else {
+        rec.flushIdle();
+        put(op);
+        for (const s of rec.slots) {
+          if (!fieldMasks[s]) continue;
+          put(fieldMasks[s]);
+          for (let i = 0; i < 8; i++) if (fieldMasks[s] & (1 << i)) put(rec.cur[s * 8 + i]);
+        }
+        if (dtChanged) {
+          put(dt);
+          rec.lastDt = dt;
+        }
+      }
+      rec.prev.set(rec.cur);
+      rec.frames++;
+      requestAnimationFrame(step);
+    };
+    requestAnimationFrame(step);
+  }
+
+  function finishRecording() {
+    const rec = state.recorder;
+    if (!rec) return null;
+    state.recorder = null;
+    rec.flushIdle();
+    const bytes = rec.bytes.subarray(0, rec.len);
+    bytes[0] = 0x4d; // "M"
+    bytes[1] = 0x52; // "R"
+    bytes[2] = 1; // version
+    bytes[3] = rec.slots.reduce((m, s) => m | (1 << s), 0);
+    new DataView(bytes.buffer).setUint32(4, rec.frames, true);
+    let bin = "";
+    for (let i = 0; i < bytes.length; i += 0x8000) bin += String.fromCharCode.apply(null, bytes.subarray(i, i + 0x8000));
+    return btoa(bin);
+  }
+
+  function decodeRecording(b64) {
+    const bin = atob(String(b64 || ""));
+    const buf = new Uint8Array(bin.length);
+    for (let i = 0; i < bin.length; i++) buf[i] = bin.charCodeAt(i);
+    if (buf.length < 8 || buf[0] !== 0x4d || buf[1] !== 0x52 || buf[2] !== 1) throw new Error("not a Maribro input recording");
+    const slotMask = buf[3];
+    const frameCount = new DataView(buf.buffer).getUint32(4, true);
+    const slots = [0, 1, 2, 3].filter((s) => slotMask & (1 << s));
+    // Expand to one 32-byte row per frame (a 30s round at 60fps is ~58KB).
+    const frames = new Uint8Array(frameCount * 32);
+    const dts = new Uint8Array(frameCount);
+    const row = new Uint8Array(32);
+    let dt = 16;
+    let pos = 8;
+    let f = 0;
+    const emit = () => {
+      frames.set(row, f * 32);
+      dts[f] = dt;
+      f++;
+    };
+    while (pos < buf.length && f < frameCount) {
+      const op = buf[pos++];
+      if (op === 0) {
+        let n = 0;
+        let shift = 0;
+        let b;
+        do {
+          b = buf[pos++];
+          n |= (b & 0x7f) << shift;
+          shift += 7;
+        } while (b & 0x80);
+        for (let i = 0; i < n && f < frameCount; i++) emit();
+        continue;
+      }
+      for (const s of slots) {
+        if (!(op & (1 << s))) continue;
+        const mask = buf[pos++];
+        for (let i = 0; i < 8; i++) if (mask & (1 << i)) row[s * 8 + i] = buf[pos++];
+      }
+      if (op & 0x10) dt = buf[pos++];
+      emit();
+    }
+    return { slots, frameCount: f, frames, dts };
+  }
+
+  function replayInputForSlot(s) {
+    const r = state.replay;
+    if (!r.frameCount || !r.slots.includes(s)) return makeEmptyInput();
+    return unpackInput(r.frames, Math.min(r.frame, r.frameCount - 1) * 32 + s * 8);
+  }
+
+  function bootReplayMode(spec) {
+    const decoded = decodeRecording(spec.recording);
+    state.replay = { ...decoded, frame: 0, steps: 0, elapsedMs: 0, done: false };
+    const maxDurationSec = Number(spec.maxDurationSec || 30);
+    // One recorded frame per animation frame (frame k is visible during the k-th
+    // callback, as when it was recorded); the clock follows the recorded dts.
+    const step = () => {
+      const r = state.replay;
+      if (r.steps > 0) r.frame = Math.min(r.frame + 1, r.frameCount);
+      r.steps++;
+      if (r.frame < r.frameCount) r.elapsedMs += r.dts[r.frame];
+      r.done = r.frame >= r.frameCount - 1;
+      state.lastTick = { nowMs: performance.now(), timeRemainingMs: Math.max(0, maxDurationSec * 1000 - r.elapsedMs) };
+      requestAnimationFrame(step);
+    };
+    const playersBySlot = decoded.slots.map((slot) => ({ slot, avatarId: `replay-${slot}`, name: `Player ${slot + 1}` }));
+    setReady({ playersBySlot, maxDurationSec, slotToGamepadIndex: [-1, -1, -1, -1], activeSlots: decoded.slots });
+    requestAnimationFrame(step);
+  }
+
   function getActiveSlots() {
     const slots = state.ctx?.activeSlots;
     return Array.isArray(slots) ? slots.slice() : [];
@@ -180,11 +401,14 @@
     const scores = Array.isArray(scoresBySlot) ? scoresBySlot.slice(0, 4) : [0, 0, 0, 0];
     while (scores.length < 4) scores.push(0);
 
-    if (state.mock) {
-      console.log("[Maribro mock] endGame", scores);
+    if (state.mock || state.replay) {
+      console.log(`[Maribro ${state.replay ? "replay" : "mock"}] endGame`, scores);
       return;
     }
-    post("maribro:game_end", { scoresBySlot: scores, endedAtMs: performance.now() });
+    const payload = { scoresBySlot: scores, endedAtMs: performance.now() };
+    const recording = finishRecording();
+    if (recording) payload.inputRecording = recording;
+    post("maribro:game_end", payload);
   }
 
   function bootMockMode() {
@@ -358,6 +582,8 @@
         maxDurationSec: Number(p.maxDurationSec || 30),
         slotToGamepadIndex: p.slotToGamepadIndex || [-1, -1, -1, -1],
       });
+      // The host re-sends init a few times; only the first one starts the recorder.
+      if (p.record && !state.recorder && !state.mock) startRecorder(getActiveSlots());
       post("maribro:ready", { sdkVersion: SDK_VERSION });
     }
     if (msg.type === "maribro:tick") {
@@ -377,7 +603,10 @@
   });
 
   // If no init arrives soon, enter mock mode automatically.
-  if (!isInHostIframe()) {
+  if (window.__MARIBRO_REPLAY__) {
+    // Set by the verifier (`verify.py --replay`) before the page loads.
+    setTimeout(() => bootReplayMode(window.__MARIBRO_REPLAY__), 0);
+  } else if (!isInHostIframe()) {
     // Directly opened game file / different origin: always mock.
     setTimeout(bootMockMode, 0);
   } else {
@@ -0,0 +1,156 @@
+// Maribro host service worker: keeps the SDK, avatars and the current catalog's
+// games in Cache Storage so repeat rounds (and brief host stalls) never blank the
+// big screen. The lobby (app.js) posts the catalog when its revision changes and
+// again until the worker acknowledges it over the MessageChannel it sends along.
+
+const SHELL_CACHE = "maribro-shell-v1";
+const GAMES_CACHE = "maribro-games-v1";
+const ASSETS_CACHE = "maribro-assets-v1";
+const API_CACHE = "maribro-api-v1";
+const KNOWN_CACHES = [SHELL_CACHE, GAMES_CACHE, ASSETS_CACHE, API_CACHE];
+
+const SHELL_URLS = ["/", "/index.html", "/app.js", "/style.css", "/public/maribro-sdk.js", "/avatars/avatars.json"];
+const REV_HEADER = "x-maribro-rev";
+const API_TIMEOUT_MS = 3000;
+
+let catalogRevision = null;
+let catalogSync = Promise.resolve();
+
+self.addEventListener("install", (event) => {
+  event.waitUntil(
+    caches
+      .open(SHELL_CACHE)
+      .then((cache) => cache.addAll(SHELL_URLS))
+      .catch((e) => console.warn("[maribro-sw] precache failed", e))
+      .then(() => self.skipWaiting())
+  );
+});
+
+self.addEventListener("activate", (event) => {
+  event.waitUntil(
+    caches
+      .keys()
+      .then((names) => Promise.all(names.filter((n) => !KNOWN_CACHES.includes(n)).map((n) => caches.delete(n))))
+      .then(() => self.clients.claim())
+  );
+});
+
+async function withRev(res, rev) {
+  // Remember which catalog rev a cached game belongs to so revalidation can skip unchanged ones.
+  const headers = new Headers(res.headers);
+  headers.set(REV_HEADER, rev);
+  return new Response(await res.blob(), { status: res.status, statusText: res.statusText, headers });
+}
+
+async function syncCatalog(revision, games) {
+  // Resolves true once every game of this revision is cached; the lobby re-posts until then.
+  if (revision && revision === catalogRevision) return true;
+  const cache = await caches.open(GAMES_CACHE);
+  const wanted = new Map(games.map((g) => [new URL(`/games/${encodeURIComponent(g.filename)}`, self.location.origin).href, g.rev || ""]));
+
+  for (const req of await cache.keys()) {
+    if (!wanted.has(req.url)) await cache.delete(req);
+  }
+  for (const [url, rev] of wanted) {
+    const cached = await cache.match(url);
+    if (cached && cached.headers.get(REV_HEADER) === rev) continue;
+    try {
+      const res = await fetch(url, { cache: "no-store" });
+      if (res.ok) await cache.put(url, await withRev(res, rev));
+    } catch {
+      // Host unreachable; keep whatever we had and tell the lobby to post again.
+      return false;
+    }
+  }
+  catalogRevision = revision;
+  return true;
+}
+
+self.addEventListener("message", (event) => {
+  const msg = event.data;
+  if (!msg || msg.type !== "maribro:catalog") return;
+  const { revision, games } = msg.payload || {};
+  if (!Array.isArray(games)) return;
+  // Serialize syncs so overlapping polls don't fetch the same games twice.
+  const reply = event.ports[0];
+  catalogSync = catalogSync
+    .then(() => syncCatalog(revision, games))
+    .catch((e) => {
+      console.warn("[maribro-sw]", e);
+      return false;
+    })
+    .then((ok) => reply?.postMessage({ type: "maribro:catalog_synced", revision, ok }));
+  event.waitUntil(catalogSync);
+});
+
+async function cacheFirst(cacheName, request) {
+  const cache = await caches.open(cacheName);
+  const cached = await cache.match(request);
+  if (cached) return cached;
+  const res = await fetch(request);
+  if (res.ok) cache.put(request, res.clone());
+  return res;
+}
+
+async function staleWhileRevalidate(cacheName, request, event) {
+  const cache = await caches.open(cacheName);
+  const cached = await cache.match(request);
+  const network = fetch(request)
+    .then((res) => {
+      if (res.ok) return cache.put(request, res.clone()).then(() => res);
+      return res;
+    })
+    .catch(() => null);
+  if (cached) {
+    event.waitUntil(network);
+    return cached;
+  }
+  return (await network) || Response.error();
+}
+
+async function networkFirst(cacheName, request) {
+  const cache = await caches.open(cacheName);
+  const timeout = new Promise((resolve) => setTimeout(() => resolve(null), API_TIMEOUT_MS));
+  const network = fetch(request)
+    .then((res) => {
+      if (res.ok) cache.put(request, res.clone());
+      return res;
+    })
+    .catch(() => null);
+  const res = await Promise.race([network, timeout]);
+  if (res) return res;
+  return (await cache.match(request)) || (await network) || Response.error();
+}
+
+self.addEventListener("fetch", (event) => {
+  const req = event.request;
+  if (req.method !== "GET") return;
+  const url = new URL(req.url);
+  if (url.origin !== self.location.origin) return;
+  const path = url.pathname;
+
+  // Content-addressed, never change.
+  if (path.startsWith("/assets/")) {
+    event.respondWith(cacheFirst(ASSETS_CACHE, req));
+    return;
+  }
+  // Kept fresh by the catalog revision posted from the lobby.
+  if (path.startsWith("/games/") && path.endsWith(".html")) {
+    event.respondWith(
+      caches
+        .open(GAMES_CACHE)
+        .then((cache) => cache.match(url.href))
+        .then((cached) => cached || fetch(req))
+    );
+    return;
+  }
+  // Catalog + avatars: fresh when the host answers, last known copy when it stalls.
+  if (path === "/api/games" || path === "/api/avatars") {
+    event.respondWith(networkFirst(API_CACHE, req));
+    return;
+  }
+  if (path.startsWith("/api/")) return;
+  if (SHELL_URLS.includes(path) || path.startsWith("/avatars/")) {
+    event.respondWith(staleWhileRevalidate(SHELL_CACHE, req, event));
+  }
+});
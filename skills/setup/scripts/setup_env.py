@@ -2,12 +2,18 @@
 from __future__ import annotations
 
 import argparse
+import hashlib
+import json
 import os
 import platform
 import re
 import shutil
 import subprocess
+import time
+from concurrent.futures import FIRST_COMPLETED, Future, ThreadPoolExecutor, wait
+from dataclasses import dataclass
 from pathlib import Path
+from typing import Callable
 
 
 def run(cmd: list[str]) -> tuple[int, str]:
@@ -36,6 +42,11 @@ def parse_args() -> argparse.Namespace:
         default="host",
         help="Setup profile. host includes tunnel-sharing checks; vibe-coder skips them.",
     )
+    parser.add_argument(
+        "--quick",
+        action="store_true",
+        help="Skip steps that passed before with unchanged inputs (lockfile, Python, browser install, probe files).",
+    )
     return parser.parse_args()
 
 
@@ -108,85 +119,152 @@ def ensure_uv() -> str | None:
     return None
 
 
-def main() -> int:
-    args = parse_args()
-    probe_file = Path(args.probe_file)
-    if not probe_file.exists():
-        print(f"ERROR: probe file not found: {probe_file}")
-        return 2
+# Steps run concurrently as soon as the steps they need have passed. Each step has
+# a fingerprint of its inputs; passing results are cached in the project venv
+# (deleting .venv forgets them) and `--quick` skips steps whose fingerprint still
+# matches a cached pass.
 
-    verifier = Path("skills/verify-game/scripts/verify.py")
-    if not verifier.exists():
-        print("ERROR: verifier not found at skills/verify-game/scripts/verify.py")
-        return 2
 
-    print("Maribro environment setup")
-    print(f"Platform: {platform.system()} {platform.release()}")
-    print(f"Role: {args.role}")
+@dataclass
+class Step:
+    key: str
+    title: str
+    cmd: list[str]
+    fingerprint: Callable[[], str]
+    needs: tuple[str, ...] = ()
+    status: str = "pending"  # pending | running | ok | failed | cached | blocked
+    code: int = 0
+    out: str = ""
+    seconds: float = 0.0
 
-    uv_bin = ensure_uv()
-    if not uv_bin:
-        return 1
 
-    server_file = Path("backend/server.py")
-    export_file = Path("backend/export.sh")
-    if not server_file.exists():
-        print("ERROR: missing backend/server.py")
-        return 2
-    if not export_file.exists():
-        print("ERROR: missing backend/export.sh")
-        return 2
+def hash_files(*paths: Path) -> str:
+    digest = hashlib.sha256()
+    for path in paths:
+        digest.update(str(path).encode())
+        digest.update(path.read_bytes() if path.is_file() else b"<missing>")
+    return digest.hexdigest()[:16]
 
-    if not shutil.which("curl"):
-        print(
-            "ACTION_REQUIRED: `curl` is required for export/upload flow. "
-            "Install curl, then run this setup script again."
-        )
-        return 1
-
-    sync_core_cmd = [uv_bin, "sync", "--extra", "verify"]
-    print_cmd("Install core + verifier deps", sync_core_cmd)
-    code, out = run(sync_core_cmd)
-    print(out.strip())
-    if code != 0:
-        print("\nACTION_REQUIRED: `uv sync --extra verify` failed. Resolve this first.")
-        return 1
 
-    host_import_cmd = [uv_bin, "run", "python3", "-c", "import backend.server; print('backend.server import OK')"]
-    print_cmd("Host import check", host_import_cmd)
-    code, out = run(host_import_cmd)
-    print(out.strip())
-    if code != 0:
-        print("\nACTION_REQUIRED: host import check failed. Resolve backend/server.py issues, then retry.")
-        return 1
+def python_fingerprint() -> str:
+    pinned = Path(".python-version")
+    pin = pinned.read_text().strip() if pinned.is_file() else ""
+    return f"{platform.python_implementation()}-{platform.python_version()}-{pin}"
 
-    export_help_cmd = [str(export_file), "--help"]
-    print_cmd("Export script check", export_help_cmd)
-    code, out = run(export_help_cmd)
-    print(out.strip())
-    if code != 0:
-        print("\nACTION_REQUIRED: backend/export.sh failed to run. Resolve and retry.")
-        return 1
 
-    install_browser_cmd = [uv_bin, "run", "playwright", "install", "chromium"]
-    print_cmd("Install Playwright Chromium", install_browser_cmd)
-    code, out = run(install_browser_cmd)
-    print(out.strip())
-    if code != 0:
-        print("\nACTION_REQUIRED: Chromium install failed. Re-run the command above and fix errors.")
-        return 1
+def playwright_browsers_dir() -> Path:
+    custom = os.getenv("PLAYWRIGHT_BROWSERS_PATH", "").strip()
+    if custom and custom != "0":
+        return Path(custom).expanduser()
+    system = platform.system().lower()
+    if system == "darwin":
+        return Path.home() / "Library" / "Caches" / "ms-playwright"
+    if system == "windows":
+        return Path(os.getenv("LOCALAPPDATA", str(Path.home()))) / "ms-playwright"
+    return Path.home() / ".cache" / "ms-playwright"
+
+
+def browser_fingerprint() -> str:
+    # Installed chromium builds, and whether Playwright finished installing each one.
+    root = playwright_browsers_dir()
+    if not root.is_dir():
+        return "none"
+    builds = sorted(p for p in root.iterdir() if p.name.startswith("chromium"))
+    return ",".join(f"{p.name}:{int((p / 'INSTALLATION_COMPLETE').exists())}" for p in builds) or "none"
+
+
+def cache_path() -> Path:
+    venv = Path(os.getenv("UV_PROJECT_ENVIRONMENT", ".venv"))
+    return venv / ".maribro-setup-cache.json"
+
+
+def load_cache() -> dict[str, str]:
+    try:
+        data = json.loads(cache_path().read_text())
+    except (OSError, ValueError):
+        return {}
+    return data if isinstance(data, dict) else {}
+
+
+def save_cache(cache: dict[str, str]) -> None:
+    path = cache_path()
+    if not path.parent.is_dir():
+        return
+    tmp = path.with_suffix(".tmp")
+    tmp.write_text(json.dumps(cache, indent=2, sort_keys=True) + "\n")
+    tmp.replace(path)
+
+
+def run_step(step: Step) -> Step:
+    started = time.perf_counter()
+    step.code, step.out = run(step.cmd)
+    step.seconds = time.perf_counter() - started
+    step.status = "ok" if step.code == 0 else "failed"
+    return step
+
+
+def run_steps(steps: list[Step], quick: bool) -> None:
+    cache = load_cache()
+    by_key = {s.key: s for s in steps}
+    rerun: set[str] = set()
+    with ThreadPoolExecutor(max_workers=len(steps)) as pool:
+        running: dict[Future, Step] = {}
+        while True:
+            for step in steps:
+                if step.status != "pending":
+                    continue
+                deps = [by_key[k] for k in step.needs]
+                if any(d.status in ("failed", "blocked") for d in deps):
+                    step.status = "blocked"
+                    continue
+                if any(d.status in ("pending", "running") for d in deps):
+                    continue
+                # A step is reused only if nothing it depends on ran again this time.
+                if quick and not rerun.intersection(step.needs) and cache.get(step.key) == step.fingerprint():
+                    step.status = "cached"
+                    continue
+                step.status = "running"
+                rerun.add(step.key)
+                running[pool.submit(run_step, step)] = step
+            if not running:
+                break
+            finished, _ = wait(running, return_when=FIRST_COMPLETED)
+            for fut in finished:
+                step = running.pop(fut)
+                fut.result()
+                print_cmd(step.title, step.cmd)
+                print(step.out.strip())
+                if step.status == "ok":
+                    # Fingerprint after the run: steps like the browser install change their own inputs.
+                    cache[step.key] = step.fingerprint()
+                else:
+                    cache.pop(step.key, None)
+                save_cache(cache)
+
+
+def print_timings(steps: list[Step], wall: float) -> None:
+    print("\n== Timings ==")
+    width = max(len(s.title) for s in steps)
+    for step in steps:
+        took = f"{step.seconds:6.1f}s" if step.status in ("ok", "failed") else "      -"
+        print(f"  {step.title:<{width}}  {took}  {step.status}")
+    print(f"  {'total (wall clock)':<{width}}  {wall:6.1f}s")
+
+
+def report(steps: dict[str, Step], args: argparse.Namespace) -> int:
+    failures = {
+        "sync": "`uv sync --extra verify --extra zstd --extra fast-json` failed. Resolve this first.",
+        "host_import": "host import check failed. Resolve backend/server.py issues, then retry.",
+        "export_help": "backend/export.sh failed to run. Resolve and retry.",
+        "browser": "Chromium install failed. Re-run the command above and fix errors.",
+    }
+    for key, message in failures.items():
+        if steps[key].status == "failed":
+            print(f"\nACTION_REQUIRED: {message}")
+            return 1
 
-    verify_cmd = [
-        uv_bin,
-        "run",
-        "python3",
-        "skills/verify-game/scripts/verify.py",
-        str(probe_file),
-    ]
-    print_cmd("Runtime verification probe", verify_cmd)
-    code, out = run(verify_cmd)
-    print(out.strip())
-    if code == 0:
+    probe = steps["probe"]
+    if probe.status in ("ok", "cached"):
         token = os.getenv("MARIBRO_UPLOAD_TOKEN", "maribro-upload").strip() or "maribro-upload"
         print(f"\nUpload token: {token} (override with MARIBRO_UPLOAD_TOKEN)")
         if args.role == "host":
@@ -209,6 +287,7 @@ def main() -> int:
         print("\nREADY: environment setup is working.")
         return 0
 
+    out = probe.out
     missing_lib_match = re.search(r"browser runtime dependency missing:\s*([^\.\s]+)", out)
     if missing_lib_match:
         missing_lib = missing_lib_match.group(1)
@@ -243,5 +322,75 @@ def main() -> int:
     return 1
 
 
+def main() -> int:
+    started = time.perf_counter()
+    args = parse_args()
+    probe_file = Path(args.probe_file)
+    if not probe_file.exists():
+        print(f"ERROR: probe file not found: {probe_file}")
+        return 2
+
+    verifier = Path("skills/verify-game/scripts/verify.py")
+    if not verifier.exists():
+        print("ERROR: verifier not found at skills/verify-game/scripts/verify.py")
+        return 2
+
+    print("Maribro environment setup")
+    print(f"Platform: {platform.system()} {platform.release()}")
+    print(f"Role: {args.role}")
+
+    uv_bin = ensure_uv()
+    if not uv_bin:
+        return 1
+
+    server_file = Path("backend/server.py")
+    export_file = Path("backend/export.sh")
+    if not server_file.exists():
+        print("ERROR: missing backend/server.py")
+        return 2
+    if not export_file.exists():
+        print("ERROR: missing backend/export.sh")
+        return 2
+
+    if not shutil.which("curl"):
+        print(
+            "ACTION_REQUIRED: `curl` is required for export/upload flow. "
+            "Install curl, then run this setup script again."
+        )
+        return 1
+
+    def deps() -> str:
+        return hash_files(Path("pyproject.toml"), Path("uv.lock")) + "|" + python_fingerprint()
+
+    steps = [
+        Step("sync", "Install core + verifier deps", [uv_bin, "sync", "--extra", "verify", "--extra", "zstd", "--extra", "fast-json"], deps),
+        Step(
+            "host_import",
+            "Host import check",
+            [uv_bin, "run", "python3", "-c", "import backend.server; print('backend.server import OK')"],
+            lambda: deps() + "|" + hash_files(*sorted(Path("backend").glob("*.py"))),
+            needs=("sync",),
+        ),
+        Step("export_help", "Export script check", [str(export_file), "--help"], lambda: hash_files(export_file)),
+        Step(
+            "browser",
+            "Install Playwright Chromium",
+            [uv_bin, "run", "playwright", "install", "chromium"],
+            lambda: deps() + "|" + browser_fingerprint(),
+            needs=("sync",),
+        ),
+        Step(
+            "probe",
+            "Runtime verification probe",
+            [uv_bin, "run", "python3", str(verifier), str(probe_file)],
+            lambda: "|".join((deps(), browser_fingerprint(), hash_files(probe_file, verifier, Path("public/maribro-sdk.js")))),
+            needs=("browser",),
+        ),
+    ]
+    run_steps(steps, args.quick)
+    print_timings(steps, time.perf_counter() - started)
+    return report({s.key: s for s in steps}, args)
+
+
 if __name__ == "__main__":
     raise SystemExit(main())
@@ -4,17 +4,25 @@ from __future__ import annotations
 import asyncio
 import argparse
 import http.server
+import json
+import os
 import shutil
 import socketserver
 import re
 import sys
 import tempfile
 import threading
+import urllib.error
+import urllib.parse
+import urllib.request
 from pathlib import Path
+from typing import Any, Optional
 
 MAX_BYTES = 20 * 1024 * 1024
 RUNTIME_SIM_MS = 9000
 RUNTIME_TIMEOUT_MS = 24000
+REPO_ROOT = Path(__file__).resolve().parents[3]
+DEFAULT_HOST = os.getenv("MARIBRO_HOST", "http://127.0.0.1:8000")
 
 
 def _print(kind: str, name: str, msg: str = "") -> None:
@@ -46,7 +54,17 @@ def _supports_multiplayer_markers(lower: str) -> bool:
     return any(c in lower for c in checks)
 
 
-def _run_runtime_flow_check(game_path: Path) -> tuple[str, str]:
+def _run_runtime_flow_check(
+    game_path: Path,
+    replay: Optional[dict[str, Any]] = None,
+    sdk_src: Optional[Path] = None,
+    observed: Optional[dict[str, Any]] = None,
+    asset_host: str = "",
+) -> tuple[str, str]:
+    # With `replay` ({recording, maxDurationSec}) the SDK plays back a recorded round
+    # instead of the synthetic square-wave input; `observed` receives the endGame result.
+    # With `asset_host`, /assets/* is proxied to that host (for games downloaded from
+    # it, whose served copy references extracted assets).
     try:
         from playwright.async_api import TimeoutError as PlaywrightTimeoutError
         from playwright.async_api import async_playwright
@@ -59,7 +77,7 @@ def _run_runtime_flow_check(game_path: Path) -> tuple[str, str]:
             ),
         )
 
-    sdk_src = game_path.parent.parent / "public" / "maribro-sdk.js"
+    sdk_src = sdk_src or game_path.parent.parent / "public" / "maribro-sdk.js"
     if not sdk_src.exists():
         return False, f"missing SDK file: {sdk_src}"
 
@@ -67,6 +85,25 @@ def _run_runtime_flow_check(game_path: Path) -> tuple[str, str]:
         def log_message(self, _format: str, *_args: object) -> None:
             return
 
+        def do_GET(self) -> None:
+            if not (asset_host and self.path.startswith("/assets/")):
+                return super().do_GET()
+            try:
+                with urllib.request.urlopen(asset_host + self.path, timeout=30) as res:
+                    body = res.read()
+                    content_type = res.headers.get("content-type", "application/octet-stream")
+            except urllib.error.HTTPError as e:
+                self.send_error(e.code)
+                return
+            except OSError:
+                self.send_error(502)
+                return
+            self.send_response(200)
+            self.send_header("content-type", content_type)
+            self.send_header("content-length", str(len(body)))
+            self.end_headers()
+            self.wfile.write(body)
+
     class ReusableTCPServer(socketserver.TCPServer):
         allow_reuse_address = True
 
@@ -88,11 +125,13 @@ def _run_runtime_flow_check(game_path: Path) -> tuple[str, str]:
                 async with async_playwright() as p:
                     browser = await p.chromium.launch(headless=True)
                     page = await browser.new_page()
+                    if replay is not None:
+                        await page.add_init_script(f"window.__MARIBRO_REPLAY__ = {json.dumps(replay)};")
                     await page.goto(url, wait_until="domcontentloaded")
                     await page.wait_for_function("() => !!window.Maribro", timeout=6000)
 
                     await page.evaluate(
-                        """(simMs) => {
+                        """([simMs, replaying]) => {
                           const original = {
                             endGame: window.Maribro.endGame.bind(window.Maribro),
                             getInput: window.Maribro.getInput.bind(window.Maribro),
@@ -100,6 +139,17 @@ def _run_runtime_flow_check(game_path: Path) -> tuple[str, str]:
                           const startedAt = performance.now();
                           window.__verify_result = { done: false };
 
+                          window.Maribro.endGame = (scoresBySlot) => {
+                            window.__verify_result = {
+                              done: true,
+                              elapsedMs: performance.now() - startedAt,
+                              scoresBySlot,
+                            };
+                            return original.endGame(scoresBySlot);
+                          };
+                          // Replays take input and clock from the recording.
+                          if (replaying) return;
+
                           window.Maribro.getTimeRemainingMs = () =>
                             Math.max(0, simMs - (performance.now() - startedAt));
 
@@ -121,25 +171,21 @@ def _run_runtime_flow_check(game_path: Path) -> tuple[str, str]:
                               },
                             };
                           };
-
-                          window.Maribro.endGame = (scoresBySlot) => {
-                            window.__verify_result = {
-                              done: true,
-                              elapsedMs: performance.now() - startedAt,
-                              scoresBySlot,
-                            };
-                            return original.endGame(scoresBySlot);
-                          };
                         }""",
-                        RUNTIME_SIM_MS,
+                        [RUNTIME_SIM_MS, replay is not None],
                     )
 
+                    timeout_ms = RUNTIME_TIMEOUT_MS
+                    if replay is not None:
+                        timeout_ms = max(timeout_ms, int(float(replay.get("maxDurationSec") or 30) * 1000) + 15000)
                     await page.wait_for_function(
                         "() => window.__verify_result && window.__verify_result.done === true",
-                        timeout=RUNTIME_TIMEOUT_MS,
+                        timeout=timeout_ms,
                     )
                     result = await page.evaluate("() => window.__verify_result")
                     await browser.close()
+                    if observed is not None:
+                        observed.update(result)
 
                     scores = result.get("scoresBySlot")
                     if not isinstance(scores, list):
@@ -206,7 +252,11 @@ def parse_args(argv: list[str]) -> argparse.Namespace:
         prog="verify.py",
         description="Verify Maribro minigame contract checks for a single HTML file.",
     )
-    parser.add_argument("file", help="Path to game HTML (for example: games/my-game.html)")
+    parser.add_argument(
+        "file",
+        nargs="?",
+        help="Path to game HTML (for example: games/my-game.html); optional with --replay",
+    )
     parser.add_argument(
         "--allow-no-runtime",
         action="store_true",
@@ -217,11 +267,97 @@ def parse_args(argv: list[str]) -> argparse.Namespace:
         action="store_true",
         help=argparse.SUPPRESS,
     )
-    return parser.parse_args(argv[1:])
+    parser.add_argument(
+        "--replay",
+        metavar="ID",
+        help="Replay the input recorded for history entry ID (from the host's session) instead of synthetic input.",
+    )
+    parser.add_argument("--host", default=DEFAULT_HOST, help=f"Host to fetch --replay recordings from (default: {DEFAULT_HOST}).")
+    parser.add_argument("--room", default="", help="Room whose session holds the --replay entry (default room if omitted).")
+    args = parser.parse_args(argv[1:])
+    if not args.file and not args.replay:
+        parser.error("the following arguments are required: file")
+    return args
+
+
+def _fetch_json(url: str) -> dict[str, Any]:
+    try:
+        with urllib.request.urlopen(url, timeout=15) as res:
+            return json.loads(res.read().decode("utf-8"))
+    except urllib.error.HTTPError as e:
+        try:
+            data = json.loads(e.read().decode("utf-8"))
+            raise RuntimeError(data.get("error", {}).get("message") or str(e)) from None
+        except (ValueError, AttributeError):
+            raise RuntimeError(str(e)) from None
+
+
+def run_replay(args: argparse.Namespace) -> int:
+    host = args.host.rstrip("/")
+    base = f"{host}/api/rooms/{urllib.parse.quote(args.room)}" if args.room else f"{host}/api"
+    try:
+        data = _fetch_json(f"{base}/session/recordings/{urllib.parse.quote(args.replay)}")
+    except Exception as e:
+        fail("replay_fetch", f"{host}: {e}")
+        return 1
+    entry = data.get("entry") or {}
+    game = data.get("game") or {}
+    rec = entry.get("recording") or {}
+    ok("replay_fetch", f"entry {args.replay}: {entry.get('gameId')} ({rec.get('frames', '?')} frames, {rec.get('bytes', '?')} bytes)")
+
+    with tempfile.TemporaryDirectory(prefix="maribro-replay-") as td:
+        asset_host = ""
+        if args.file:
+            path = Path(args.file)
+        elif game.get("filename") and (REPO_ROOT / "games" / game["filename"]).exists():
+            path = REPO_ROOT / "games" / game["filename"]
+        elif game.get("filename"):
+            path = Path(td) / game["filename"]
+            try:
+                with urllib.request.urlopen(f"{host}/games/{urllib.parse.quote(game['filename'])}", timeout=30) as res:
+                    path.write_bytes(res.read())
+            except Exception as e:
+                fail("replay_game", f"could not download {game['filename']}: {e}")
+                return 1
+            # The host serves a copy whose large inline assets point at its /assets/.
+            asset_host = host
+        else:
+            fail("replay_game", f"game {entry.get('gameId')!r} is no longer in the host catalog; pass its file explicitly")
+            return 1
+        if not path.exists():
+            fail("replay_game", f"file not found: {path}")
+            return 1
+        ok("replay_game", str(path))
+
+        observed: dict[str, Any] = {}
+        replay = {"recording": data.get("recording") or "", "maxDurationSec": game.get("maxDurationSec") or 30}
+        status, msg = _run_runtime_flow_check(
+            path,
+            replay=replay,
+            sdk_src=REPO_ROOT / "public" / "maribro-sdk.js",
+            observed=observed,
+            asset_host=asset_host,
+        )
+    if status != "ok":
+        fail("replay_runtime", msg)
+        return 1
+    ok("replay_runtime", msg)
+
+    # The host stores scores clamped to 0..10 and rounded.
+    got = [int(round(max(0.0, min(10.0, float(x))))) for x in (observed.get("scoresBySlot") or [])[:4]]
+    want = list(entry.get("scoresBySlot") or [])
+    if got == want:
+        ok("replay_scores", f"{got} matches the recorded round")
+    else:
+        # Games that read Math.random() or wall-clock time won't replay bit-exactly.
+        warn("replay_scores", f"replayed {got}, recorded {want} (game is not fully input-deterministic)")
+    return 0
 
 
 def main(argv: list[str]) -> int:
     args = parse_args(argv)
+    if args.replay:
+        return run_replay(args)
 
     path = Path(args.file)
     if not path.exists():
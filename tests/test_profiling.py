@@ -0,0 +1,87 @@
+"""Profiler samples go to the request that produced them.
+
+Two profiled requests run at the same time: a slow sync handler (threadpool) and
+a slow async handler (event loop). Each one's collapsed stacks must contain only
+its own busy function.
+
+    uv run python3 tests/test_profiling.py      # or: pytest tests/
+"""
+
+from __future__ import annotations
+
+import sys
+import threading
+import time
+from pathlib import Path
+
+from fastapi import APIRouter, FastAPI
+from fastapi.testclient import TestClient
+
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
+
+from backend.profiling import Profiler, ThreadTaggingRoute  # noqa: E402
+
+BUSY_SEC = 0.4
+
+
+def _burn_in_thread() -> None:
+    deadline = time.perf_counter() + BUSY_SEC
+    while time.perf_counter() < deadline:
+        sum(range(200))
+
+
+def _burn_on_loop() -> None:
+    deadline = time.perf_counter() + BUSY_SEC
+    while time.perf_counter() < deadline:
+        sum(range(200))
+
+
+def _make_app(profiler: Profiler) -> FastAPI:
+    app = FastAPI()
+    app.router.route_class = ThreadTaggingRoute
+    router = APIRouter(route_class=ThreadTaggingRoute)
+
+    @router.get("/sync_slow")
+    def sync_slow() -> dict:
+        _burn_in_thread()
+        return {}
+
+    @app.get("/async_slow")
+    async def async_slow() -> dict:
+        _burn_on_loop()
+        return {}
+
+    app.include_router(router, prefix="/api")
+    app.add_middleware(profiler.middleware)
+    return app
+
+
+def test_concurrent_requests_keep_their_own_stacks() -> None:
+    profiler = Profiler(sample_rate=1.0, keep=10, interval_ms=2, root=str(Path(__file__).resolve().parent))
+    with TestClient(_make_app(profiler)) as client:
+        threads = [
+            threading.Thread(target=client.get, args=("/api/sync_slow",)),
+            threading.Thread(target=client.get, args=("/async_slow",)),
+        ]
+        for t in threads:
+            t.start()
+        for t in threads:
+            t.join()
+
+    by_request: dict = {}
+    for line in profiler.collapsed().splitlines():
+        stack, _count = line.rsplit(" ", 1)
+        root = stack.split(";", 1)[0]
+        by_request.setdefault(root, []).append(stack)
+
+    sync_stacks = by_request.get("GET_/api/sync_slow", [])
+    async_stacks = by_request.get("GET_/async_slow", [])
+    assert any("_burn_in_thread" in s for s in sync_stacks), by_request.keys()
+    assert any("_burn_on_loop" in s for s in async_stacks), by_request.keys()
+    assert not any("_burn_on_loop" in s for s in sync_stacks)
+    assert not any("_burn_in_thread" in s for s in async_stacks)
+
+
+if __name__ == "__main__":
+    test_concurrent_requests_keep_their_own_stacks()
+    print("ok")
@@ -0,0 +1,166 @@
+"""Lobby latency stays flat while large uploads are being validated.
+
+Runs a real host (uvicorn + its spawn-based upload process pool) from a scratch
+copy of the repo, so it never touches this checkout's games/ or data/. Measures
+GET /api/games and GET /api/session latency idle, then again while several large
+uploads are in flight, and compares the p95s.
+
+    uv run python3 tests/test_upload_latency.py      # or: pytest tests/
+"""
+
+from __future__ import annotations
+
+import json
+import os
+import shutil
+import socket
+import subprocess
+import sys
+import tempfile
+import threading
+import time
+import urllib.error
+import urllib.request
+import uuid
+from pathlib import Path
+from typing import Dict, List
+
+ROOT = Path(__file__).resolve().parent.parent
+TOKEN = "maribro-upload"
+UPLOADS = 6  # 2 workers + 4 queued: the default admission limit, so none get 429
+UPLOAD_MB = 8
+POLL_INTERVAL_SEC = 0.02
+# Flat = p95 under load within 3x the idle p95, plus slack for scheduler noise.
+MAX_P95_FACTOR = 3.0
+SLACK_MS = 50.0
+
+
+def _free_port() -> int:
+    with socket.socket() as s:
+        s.bind(("127.0.0.1", 0))
+        return s.getsockname()[1]
+
+
+def _scratch_host(tmp: Path) -> Path:
+    for name in ("backend", "public"):
+        shutil.copytree(ROOT / name, tmp / name, ignore=shutil.ignore_patterns("__pycache__"))
+    (tmp / "games").mkdir()
+    shutil.copy(ROOT / "games" / "_template.html", tmp / "games" / "_template.html")
+    return tmp
+
+
+def _big_game() -> bytes:
+    html = (ROOT / "games" / "_template.html").read_text(encoding="utf-8")
+    filler = "<div hidden>" + "x " * (UPLOAD_MB * 512 * 1024) + "</div>"
+    return html.replace("</body>", filler + "</body>").encode("utf-8")
+
+
+def _multipart(fields: Dict[str, str], payload: bytes) -> tuple[bytes, str]:
+    boundary = uuid.uuid4().hex
+    parts = [
+        f'--{boundary}\r\nContent-Disposition: form-data; name="{k}"\r\n\r\n{v}\r\n'.encode() for k, v in fields.items()
+    ]
+    parts.append(
+        f'--{boundary}\r\nContent-Disposition: form-data; name="file"; filename="game.html"\r\n'
+        "Content-Type: text/html\r\n\r\n".encode() + payload + b"\r\n"
+    )
+    parts.append(f"--{boundary}--\r\n".encode())
+    return b"".join(parts), f"multipart/form-data; boundary={boundary}"
+
+
+def _upload(base: str, i: int, payload: bytes, results: Dict[int, object]) -> None:
+    body, content_type = _multipart({"creator_avatar_id": "knight-red", "filename": f"zz-latency-{i}.html"}, payload)
+    req = urllib.request.Request(
+        base + "/api/games", data=body, headers={"content-type": content_type, "X-Maribro-Token": TOKEN}
+    )
+    try:
+        with urllib.request.urlopen(req, timeout=120) as res:
+            results[i] = res.status
+    except urllib.error.HTTPError as e:
+        results[i] = (e.code, json.load(e).get("error", {}).get("code"))
+
+
+def _poll(base: str, until: "threading.Event | None" = None, count: int = 0) -> List[float]:
+    # Alternates the two lobby polls; runs `count` rounds, or until `until` is set.
+    samples: List[float] = []
+    while (until is None and len(samples) < count) or (until is not None and not until.is_set()):
+        for path in ("/api/games", "/api/session"):
+            started = time.perf_counter()
+            with urllib.request.urlopen(base + path, timeout=30) as res:
+                res.read()
+            samples.append((time.perf_counter() - started) * 1000)
+        time.sleep(POLL_INTERVAL_SEC)
+    return samples
+
+
+def _p95(samples: List[float]) -> float:
+    ordered = sorted(samples)
+    return ordered[min(len(ordered) - 1, int(len(ordered) * 0.95))]
+
+
+def _wait_ready(base: str, proc: subprocess.Popen, timeout: float = 30.0) -> None:
+    deadline = time.monotonic() + timeout
+    while time.monotonic() < deadline:
+        if proc.poll() is not None:
+            raise RuntimeError(f"host exited early with code {proc.returncode}")
+        try:
+            with urllib.request.urlopen(base + "/api/session", timeout=2):
+                return
+        except OSError:
+            time.sleep(0.2)
+    raise RuntimeError("host did not start")
+
+
+def test_lobby_latency_flat_during_uploads() -> None:
+    with tempfile.TemporaryDirectory(prefix="maribro-latency-") as tmp:
+        host_dir = _scratch_host(Path(tmp))
+        port = _free_port()
+        base = f"http://127.0.0.1:{port}"
+        env = dict(
+            os.environ,
+            MARIBRO_UPLOAD_RATE_PER_CLIENT="0",  # measure the pool, not the rate limiter
+            MARIBRO_UPLOAD_RATE_PER_TOKEN="0",
+        )
+        proc = subprocess.Popen(
+            [sys.executable, "-m", "uvicorn", "backend.server:app", "--host", "127.0.0.1", "--port", str(port)],
+            cwd=host_dir,
+            env=env,
+            stdout=subprocess.DEVNULL,
+            stderr=subprocess.DEVNULL,
+        )
+        try:
+            _wait_ready(base, proc)
+            _poll(base, count=10)  # warm up caches and connections
+            idle = _poll(base, count=40)
+
+            payload = _big_game()
+            results: Dict[int, object] = {}
+            threads = [threading.Thread(target=_upload, args=(base, i, payload, results)) for i in range(UPLOADS)]
+            done = threading.Event()
+            for t in threads:
+                t.start()
+
+            def _join() -> None:
+                for t in threads:
+                    t.join()
+                done.set()
+
+            joiner = threading.Thread(target=_join)
+            joiner.start()
+            busy = _poll(base, until=done)
+            joiner.join()
+        finally:
+            proc.terminate()
+            proc.wait(timeout=30)
+
+    assert all(r == 200 for r in results.values()) and len(results) == UPLOADS, results
+    assert len(busy) >= 20, f"uploads finished too fast to measure ({len(busy)} samples)"
+    idle_p95, busy_p95 = _p95(idle), _p95(busy)
+    print(f"lobby p95: idle {idle_p95:.1f} ms, during {UPLOADS} uploads {busy_p95:.1f} ms ({len(busy)} samples)")
+    assert busy_p95 <= idle_p95 * MAX_P95_FACTOR + SLACK_MS, (idle_p95, busy_p95)
+
+
+if __name__ == "__main__":
+    # The host's upload pool uses the spawn start method; keep module-level code
+    # side-effect free and only run under this guard.
+    test_lobby_latency_flat_during_uploads()